@@ -0,0 +1,94 @@
+import sys
+import time
+import tracemalloc
+
+from generator import generate_puzzle
+from logic import *
+
+
+def unchanged(knowledge):
+    return knowledge
+
+
+# Solving backends as (name, preparation, entailment check, reports),
+# where backends that report take a list to append their model counts
+# to, and the knowledge base of the others is Counted in this process
+BACKENDS = [
+    ("model_check", unchanged, model_check, False),
+    ("simplified", simplify, model_check, False),
+    ("parallel", unchanged, parallel_model_check, True),
+    ("compiled", unchanged, compiled_model_check, True),
+]
+
+
+def solve(prepare, check, knowledge, symbols):
+    """Returns the set of symbols the knowledge base entails."""
+    knowledge = prepare(knowledge)
+    return {
+        symbol.name for symbol in symbols
+        if check(knowledge, symbol)
+    }
+
+
+def count_models(prepare, check, reports, knowledge, symbols):
+    """
+    Returns how many models the knowledge base is evaluated in while
+    checking every symbol.
+    """
+    knowledge = prepare(knowledge)
+    if reports:
+        counts = []
+        for symbol in symbols:
+            check(knowledge, symbol, counts=counts)
+        return sum(counts)
+    knowledge = Counted(knowledge)
+    for symbol in symbols:
+        check(knowledge, symbol)
+    return knowledge.count
+
+
+def main():
+    if len(sys.argv) > 4:
+        sys.exit("Usage: python benchmark.py "
+                 "[characters] [statements] [seed]")
+    max_characters = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    statements = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    # tracemalloc only sees this process, so the peak of the parallel
+    # backend leaves out its worker processes
+    print("Peak memory is traced in the main process only, "
+          "without parallel workers")
+    print(f"{'N':>3} {'M':>4} {'backend':<12} {'models':>10} "
+          f"{'time (s)':>10} {'main peak (KiB)':>16}")
+    for n in range(1, max_characters + 1):
+        m = statements if statements is not None else 2 * n
+        knowledge, symbols, solution = generate_puzzle(n, m, seed=seed)
+
+        answers = dict()
+        for name, prepare, check, reports in BACKENDS:
+            models = count_models(prepare, check, reports, knowledge,
+                                  symbols)
+
+            start = time.perf_counter()
+            answers[name] = solve(prepare, check, knowledge, symbols)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            solve(prepare, check, knowledge, symbols)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{n:>3} {m:>4} {name:<12} {models:>10} "
+                  f"{elapsed:>10.4f} {peak / 1024:>16.1f}")
+
+        # Every backend must agree, and agree with the hidden assignment
+        if len(set(map(frozenset, answers.values()))) != 1:
+            sys.exit(f"Backends disagree on puzzle with {n} characters")
+        entailed = next(iter(answers.values()))
+        if any(not solution[name] for name in entailed):
+            sys.exit(f"Entailed a false symbol with {n} characters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import random
+
+from logic import *
+
+
+def character_name(i):
+    """Returns the name of the i-th character: A, B, ..., Z, P26, P27, ..."""
+    return chr(ord("A") + i) if i < 26 else f"P{i}"
+
+
+def generate_puzzle(characters, statements, seed=None):
+    """
+    Generates a random knights-and-knaves puzzle.
+
+    Every character is secretly assigned to be a knight or a knave, and
+    `statements` random claims are put in the mouths of random speakers
+    so that knights only tell the truth and knaves only lie. The puzzle
+    is therefore always consistent.
+
+    Returns a tuple (knowledge, symbols, solution) where `symbols` lists
+    the knight and knave symbol of every character and `solution` maps
+    each symbol name to its value in the hidden assignment.
+    """
+    rng = random.Random(seed)
+
+    knights = []
+    knaves = []
+    for i in range(characters):
+        name = character_name(i)
+        knights.append(Symbol(f"{name} is a Knight"))
+        knaves.append(Symbol(f"{name} is a Knave"))
+
+    solution = dict()
+    for knight, knave in zip(knights, knaves):
+        is_knight = rng.random() < 0.5
+        solution[knight.name] = is_knight
+        solution[knave.name] = not is_knight
+
+    # Each can only be either a knight or a knave, not both
+    knowledge = And()
+    for knight, knave in zip(knights, knaves):
+        knowledge.add(Not(And(knave, knight)))
+        knowledge.add(Or(knight, knave))
+
+    # Keep drawing claims, only using those consistent with the speaker
+    said = 0
+    while said < statements:
+        speaker = rng.randrange(characters)
+        claim = random_claim(rng, knights, knaves)
+        if claim.evaluate(solution) != solution[knights[speaker].name]:
+            continue
+        knowledge.add(Implication(knights[speaker], claim))
+        knowledge.add(Implication(knaves[speaker], Not(claim)))
+        said += 1
+
+    symbols = [symbol for pair in zip(knights, knaves) for symbol in pair]
+    return knowledge, symbols, solution
+
+
+def random_claim(rng, knights, knaves):
+    """Returns a random claim about one or two of the characters."""
+    x = rng.randrange(len(knights))
+    y = rng.randrange(len(knights))
+    kind = rng.randrange(5)
+
+    # "X is a knight."
+    if kind == 0:
+        return knights[x]
+
+    # "X is a knave."
+    elif kind == 1:
+        return knaves[x]
+
+    # "X and Y are the same kind."
+    elif kind == 2:
+        return Or(And(knights[x], knights[y]), And(knaves[x], knaves[y]))
+
+    # "X and Y are of different kinds."
+    elif kind == 3:
+        return Or(And(knights[x], knaves[y]), And(knaves[x], knights[y]))
+
+    # "At least one of X and Y is a knave."
+    else:
+        return Or(knaves[x], knaves[y])
@@ -1,4 +1,7 @@
 import itertools
+import multiprocessing
+import os
+import re
 
 
 class Sentence():
@@ -11,10 +14,22 @@ class Sentence():
         """Returns string formula representing logical sentence."""
         return ""
 
+    def expression(self, index):
+        """
+        Returns a Python expression evaluating the logical sentence in a
+        model stored as an integer `model`, where bit `index[name]` holds
+        the value of the symbol called `name`.
+        """
+        raise Exception("nothing to evaluate")
+
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
         return set()
 
+    def size(self):
+        """Returns the number of nodes in the logical sentence."""
+        return 1
+
     @classmethod
     def validate(cls, sentence):
         if not isinstance(sentence, Sentence):
@@ -65,10 +80,41 @@ class Symbol(Sentence):
     def formula(self):
         return self.name
 
+    def expression(self, index):
+        return f"(model & {1 << index[self.name]})"
+
     def symbols(self):
         return {self.name}
 
 
+class Constant(Sentence):
+
+    def __init__(self, value):
+        self.value = bool(value)
+
+    def __eq__(self, other):
+        return isinstance(other, Constant) and self.value == other.value
+
+    def __hash__(self):
+        return hash(("constant", self.value))
+
+    def __repr__(self):
+        return "TRUE" if self.value else "FALSE"
+
+    def evaluate(self, model):
+        return self.value
+
+    def formula(self):
+        return "⊤" if self.value else "⊥"
+
+    def expression(self, index):
+        return "True" if self.value else "False"
+
+
+TRUE = Constant(True)
+FALSE = Constant(False)
+
+
 class Not(Sentence):
     def __init__(self, operand):
         Sentence.validate(operand)
@@ -89,9 +135,15 @@ class Not(Sentence):
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
+    def expression(self, index):
+        return f"(not {self.operand.expression(index)})"
+
     def symbols(self):
         return self.operand.symbols()
 
+    def size(self):
+        return 1 + self.operand.size()
+
 
 class And(Sentence):
     def __init__(self, *conjuncts):
@@ -121,13 +173,24 @@ class And(Sentence):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
     def formula(self):
+        if not self.conjuncts:
+            return "⊤"
         if len(self.conjuncts) == 1:
             return self.conjuncts[0].formula()
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
+    def expression(self, index):
+        if not self.conjuncts:
+            return "True"
+        return "(" + " and ".join([conjunct.expression(index)
+                                   for conjunct in self.conjuncts]) + ")"
+
     def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+        return set().union(*[conjunct.symbols() for conjunct in self.conjuncts])
+
+    def size(self):
+        return 1 + sum(conjunct.size() for conjunct in self.conjuncts)
 
 
 class Or(Sentence):
@@ -152,13 +215,24 @@ class Or(Sentence):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
     def formula(self):
+        if not self.disjuncts:
+            return "⊥"
         if len(self.disjuncts) == 1:
             return self.disjuncts[0].formula()
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
+    def expression(self, index):
+        if not self.disjuncts:
+            return "False"
+        return "(" + " or ".join([disjunct.expression(index)
+                                  for disjunct in self.disjuncts]) + ")"
+
     def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+        return set().union(*[disjunct.symbols() for disjunct in self.disjuncts])
+
+    def size(self):
+        return 1 + sum(disjunct.size() for disjunct in self.disjuncts)
 
 
 class Implication(Sentence):
@@ -188,9 +262,17 @@ class Implication(Sentence):
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
+    def expression(self, index):
+        antecedent = self.antecedent.expression(index)
+        consequent = self.consequent.expression(index)
+        return f"(not {antecedent} or {consequent})"
+
     def symbols(self):
         return set.union(self.antecedent.symbols(), self.consequent.symbols())
 
+    def size(self):
+        return 1 + self.antecedent.size() + self.consequent.size()
+
 
 class Biconditional(Sentence):
     def __init__(self, left, right):
@@ -211,19 +293,169 @@ class Biconditional(Sentence):
         return f"Biconditional({self.left}, {self.right})"
 
     def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
+        return self.left.evaluate(model) == self.right.evaluate(model)
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+        left = Sentence.parenthesize(self.left.formula())
+        right = Sentence.parenthesize(self.right.formula())
         return f"{left} <=> {right}"
 
+    def expression(self, index):
+        left = self.left.expression(index)
+        right = self.right.expression(index)
+        return f"((not {left}) == (not {right}))"
+
     def symbols(self):
         return set.union(self.left.symbols(), self.right.symbols())
 
+    def size(self):
+        return 1 + self.left.size() + self.right.size()
+
+
+class Counted(Sentence):
+    """
+    Wraps a sentence and counts how many models it is evaluated in.
+    """
+
+    def __init__(self, sentence):
+        Sentence.validate(sentence)
+        self.sentence = sentence
+        self.count = 0
+
+    def evaluate(self, model):
+        self.count += 1
+        return self.sentence.evaluate(model)
+
+    def formula(self):
+        return self.sentence.formula()
+
+    def symbols(self):
+        return self.sentence.symbols()
+
+
+def compile_sentence(sentence, symbols):
+    """
+    Compiles a sentence into a function of a single integer model, where
+    bit i holds the value of the i-th symbol name in `symbols`. Each
+    operand is evaluated at most once per model.
+
+    Sentences nested too deeply for Python to compile are evaluated as
+    they are instead, on the dictionary model the integer stands for.
+    """
+    index = {name: i for i, name in enumerate(symbols)}
+    try:
+        return eval(f"lambda model: bool({sentence.expression(index)})")
+    except (SyntaxError, RecursionError, MemoryError):
+        return lambda model: sentence.evaluate({
+            name: bool(model >> i & 1) for i, name in enumerate(symbols)
+        })
+
+
+def model_bits(model, symbols):
+    """Converts a dictionary model into its integer form for `symbols`."""
+    return sum(1 << i for i, name in enumerate(symbols) if model[name])
+
+
+def substitute(sentence, old, new):
+    """Returns a copy of the sentence with every occurrence of `old` replaced by `new`."""
+    if sentence == old:
+        return new
+    if isinstance(sentence, Not):
+        return Not(substitute(sentence.operand, old, new))
+    if isinstance(sentence, And):
+        return And(*[substitute(c, old, new) for c in sentence.conjuncts])
+    if isinstance(sentence, Or):
+        return Or(*[substitute(d, old, new) for d in sentence.disjuncts])
+    if isinstance(sentence, Implication):
+        return Implication(substitute(sentence.antecedent, old, new),
+                           substitute(sentence.consequent, old, new))
+    if isinstance(sentence, Biconditional):
+        return Biconditional(substitute(sentence.left, old, new),
+                             substitute(sentence.right, old, new))
+    return sentence
+
+
+def simplify(sentence):
+    """
+    Returns an equivalent sentence with constants folded, nested
+    conjunctions and disjunctions flattened, duplicate operands removed
+    and trivially true implications dropped.
+    """
+    if isinstance(sentence, (Symbol, Constant)):
+        return sentence
+
+    elif isinstance(sentence, Not):
+        operand = simplify(sentence.operand)
+        if isinstance(operand, Constant):
+            return FALSE if operand.value else TRUE
+        if isinstance(operand, Not):
+            return operand.operand
+        return Not(operand)
+
+    elif isinstance(sentence, (And, Or)):
+        is_and = isinstance(sentence, And)
+        operands = sentence.conjuncts if is_and else sentence.disjuncts
+
+        # Identity element is dropped, absorbing element short-circuits
+        identity, absorbing = (TRUE, FALSE) if is_and else (FALSE, TRUE)
+
+        # Flatten nested operators of the same kind, keeping first occurrences
+        flat = []
+        seen = set()
+        pending = [simplify(operand) for operand in reversed(operands)]
+        while pending:
+            operand = pending.pop()
+            if type(operand) is type(sentence):
+                children = operand.conjuncts if is_and else operand.disjuncts
+                pending.extend(reversed(children))
+                continue
+            if operand == absorbing:
+                return absorbing
+            if operand == identity or operand in seen:
+                continue
+            seen.add(operand)
+            flat.append(operand)
+
+        # A symbol together with its negation is a contradiction (or tautology)
+        for operand in flat:
+            if isinstance(operand, Not) and operand.operand in seen:
+                return absorbing
+
+        if not flat:
+            return identity
+        if len(flat) == 1:
+            return flat[0]
+        return And(*flat) if is_and else Or(*flat)
+
+    elif isinstance(sentence, Implication):
+        antecedent = simplify(sentence.antecedent)
+        consequent = simplify(sentence.consequent)
+
+        # The consequent only matters in models where the antecedent holds
+        if not isinstance(antecedent, Constant):
+            consequent = simplify(substitute(consequent, antecedent, TRUE))
+        if (antecedent == consequent or antecedent == FALSE
+                or consequent == TRUE):
+            return TRUE
+        if antecedent == TRUE:
+            return consequent
+        if consequent == FALSE:
+            return simplify(Not(antecedent))
+        return Implication(antecedent, consequent)
+
+    elif isinstance(sentence, Biconditional):
+        left = simplify(sentence.left)
+        right = simplify(sentence.right)
+        if left == right:
+            return TRUE
+        if isinstance(right, Constant):
+            left, right = right, left
+        if isinstance(left, Constant):
+            return right if left.value else simplify(Not(right))
+        return Biconditional(left, right)
+
+    raise TypeError("must be a logical sentence")
+
 
 def model_check(knowledge, query):
     """Checks if knowledge base entails query."""
@@ -261,3 +493,296 @@ def model_check(knowledge, query):
 
     # Check that knowledge entails query
     return check_all(knowledge, query, symbols, dict())
+
+
+def check_subspace(knowledge, query, symbols, model):
+    """
+    Checks if knowledge base entails query in every model that extends
+    `model` with an assignment to each of the remaining `symbols`.
+    """
+    if not symbols:
+        if knowledge.evaluate(model):
+            return query.evaluate(model)
+        return True
+    p = symbols[0]
+    return all(
+        check_subspace(knowledge, query, symbols[1:], {**model, p: value})
+        for value in (True, False)
+    )
+
+
+def check_subspace_task(task):
+    """
+    Unpacks a subspace task for a worker process. Returns a tuple
+    (entailed, models) where `models` counts the models the knowledge
+    base was evaluated in if the task asks for counting, and is None
+    otherwise.
+    """
+    knowledge, query, symbols, model, counting = task
+    if not counting:
+        return check_subspace(knowledge, query, symbols, model), None
+    knowledge = Counted(knowledge)
+    return check_subspace(knowledge, query, symbols, model), knowledge.count
+
+
+def parallel_model_check(knowledge, query, split=None, processes=None,
+                         counts=None):
+    """
+    Checks if knowledge base entails query, splitting the models over a
+    pool of worker processes.
+
+    The first `split` symbols are fixed to each of their 2^split
+    assignments and every resulting subspace is checked by a worker.
+    All workers are cancelled as soon as one finds a counterexample.
+    If `counts` is a list, the number of models the knowledge base was
+    evaluated in by the subspaces checked is appended to it.
+    """
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    processes = processes or os.cpu_count() or 1
+
+    # By default, make a few more subspaces than there are workers
+    if split is None:
+        split = (4 * processes - 1).bit_length()
+    split = min(split, len(symbols))
+    fixed, remaining = symbols[:split], symbols[split:]
+
+    tasks = [
+        (knowledge, query, remaining, dict(zip(fixed, values)),
+         counts is not None)
+        for values in itertools.product((True, False), repeat=split)
+    ]
+    models = 0
+    entailed = True
+    with multiprocessing.Pool(processes) as pool:
+
+        # Leaving the block terminates any workers still running
+        for entailed, evaluated in pool.imap_unordered(check_subspace_task,
+                                                       tasks):
+            if counts is not None:
+                models += evaluated
+            if not entailed:
+                break
+    if counts is not None:
+        counts.append(models)
+    return entailed
+
+
+def compiled_model_check(knowledge, query, counts=None):
+    """
+    Checks if knowledge base entails query, enumerating models as integers
+    and evaluating a compiled form of the sentences. If `counts` is a
+    list, the number of models evaluated is appended to it.
+    """
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    entailed = compile_sentence(Implication(knowledge, query), symbols)
+    models = range(1 << len(symbols))
+    counterexample = next(itertools.filterfalse(entailed, models), None)
+    if counts is not None:
+        counts.append(
+            len(models) if counterexample is None else counterexample + 1
+        )
+    return counterexample is None
+
+
+# Operators of the textual syntax, with ASCII alternatives, then symbol
+# names, then any character that cannot start a token
+TOKENS = re.compile(
+    r"(?P<operator><=>|=>|[¬~!∧&∨|()⊤⊥])"
+    r"|(?P<symbol>[^¬~!∧&∨|()⊤⊥<=>]+)"
+    r"|(?P<error>.)",
+    re.DOTALL
+)
+OPERATORS = {
+    "¬": "not", "~": "not", "!": "not",
+    "∧": "and", "&": "and",
+    "∨": "or", "|": "or",
+    "=>": "implies", "<=>": "iff",
+    "(": "(", ")": ")",
+    "⊤": "true", "⊥": "false"
+}
+
+
+def parse(text):
+    """
+    Parses a formula, as produced by Sentence.formula, into a sentence.
+
+    From loosest to tightest binding the operators are <=>, =>, ∨ (or |),
+    ∧ (or &) and ¬ (or ~ or !); => groups to the right. Symbol names run
+    up to the next operator or parenthesis, with surrounding whitespace
+    removed. ⊤ and ⊥ are the constants TRUE and FALSE.
+
+    Raises ValueError if the text is not a well-formed formula.
+    """
+    tokens = []
+    for match in TOKENS.finditer(text):
+        kind, token = match.lastgroup, match.group()
+        if kind == "error":
+            raise ValueError(
+                f"unexpected {token!r} at position {match.start()}"
+            )
+        if kind == "operator":
+            tokens.append((OPERATORS[token], None))
+        elif token.strip():
+            tokens.append(("symbol", token.strip()))
+    tokens.append(("end", None))
+
+    symbols = dict()
+    position = 0
+
+    def expect(kind):
+        nonlocal position
+        if tokens[position][0] != kind:
+            found = tokens[position][1] or tokens[position][0]
+            raise ValueError(f"expected {kind}, found {found}")
+        position += 1
+
+    def biconditional():
+        left = implication()
+        while tokens[position][0] == "iff":
+            expect("iff")
+            left = Biconditional(left, implication())
+        return left
+
+    def implication():
+        antecedent = disjunction()
+        if tokens[position][0] == "implies":
+            expect("implies")
+            return Implication(antecedent, implication())
+        return antecedent
+
+    def disjunction():
+        disjuncts = [conjunction()]
+        while tokens[position][0] == "or":
+            expect("or")
+            disjuncts.append(conjunction())
+        return disjuncts[0] if len(disjuncts) == 1 else Or(*disjuncts)
+
+    def conjunction():
+        conjuncts = [negation()]
+        while tokens[position][0] == "and":
+            expect("and")
+            conjuncts.append(negation())
+        return conjuncts[0] if len(conjuncts) == 1 else And(*conjuncts)
+
+    def negation():
+        nonlocal position
+        kind, name = tokens[position]
+        if kind == "not":
+            position += 1
+            return Not(negation())
+        elif kind == "(":
+            position += 1
+            sentence = biconditional()
+            expect(")")
+            return sentence
+        elif kind == "true" or kind == "false":
+            position += 1
+            return TRUE if kind == "true" else FALSE
+        expect("symbol")
+        if name not in symbols:
+            symbols[name] = Symbol(name)
+        return symbols[name]
+
+    sentence = biconditional()
+    expect("end")
+    return sentence
+
+
+def dumps(knowledge):
+    """
+    Serializes a knowledge base into a compact string.
+
+    The string starts with a header line and the symbol names, one per
+    line, followed by each top-level conjunct on its own line in prefix
+    notation. Symbols are written as their index in the names, and
+    operators as ~, &k, |k (with k operands), > and =, with T and F for
+    the constants. A sentence that is not an And is stored as a knowledge
+    base with a single conjunct.
+    """
+    names = sorted(knowledge.symbols())
+    index = {name: i for i, name in enumerate(names)}
+
+    def prefix(sentence, tokens):
+        if isinstance(sentence, Symbol):
+            tokens.append(str(index[sentence.name]))
+        elif isinstance(sentence, Constant):
+            tokens.append("T" if sentence.value else "F")
+        elif isinstance(sentence, Not):
+            tokens.append("~")
+            prefix(sentence.operand, tokens)
+        elif isinstance(sentence, (And, Or)):
+            is_and = isinstance(sentence, And)
+            operands = sentence.conjuncts if is_and else sentence.disjuncts
+            tokens.append(f"{'&' if is_and else '|'}{len(operands)}")
+            for operand in operands:
+                prefix(operand, tokens)
+        elif isinstance(sentence, Implication):
+            tokens.append(">")
+            prefix(sentence.antecedent, tokens)
+            prefix(sentence.consequent, tokens)
+        elif isinstance(sentence, Biconditional):
+            tokens.append("=")
+            prefix(sentence.left, tokens)
+            prefix(sentence.right, tokens)
+        else:
+            raise TypeError("must be a logical sentence")
+        return tokens
+
+    if isinstance(knowledge, And):
+        conjuncts = knowledge.conjuncts
+    else:
+        conjuncts = [knowledge]
+    lines = [f"kb 1 {len(names)}", *names]
+    lines.extend(" ".join(prefix(conjunct, [])) for conjunct in conjuncts)
+    return "\n".join(lines) + "\n"
+
+
+def loads(text):
+    """Deserializes a knowledge base produced by `dumps` into an And."""
+    lines = text.split("\n")
+    header = lines[0].split()
+    if len(header) != 3 or header[:2] != ["kb", "1"]:
+        raise ValueError("not a serialized knowledge base")
+    count = int(header[2])
+    symbols = [Symbol(name) for name in lines[1:count + 1]]
+
+    knowledge = And()
+    for line in lines[count + 1:]:
+        if not line:
+            continue
+
+        # Prefix notation is evaluated right to left with a stack
+        stack = []
+        for token in reversed(line.split(" ")):
+            kind = token[0]
+            if kind.isdigit():
+                stack.append(symbols[int(token)])
+            elif kind == "~":
+                stack.append(Not(stack.pop()))
+            elif kind == "&" or kind == "|":
+                operands = [stack.pop() for _ in range(int(token[1:]))]
+                stack.append(And(*operands) if kind == "&" else Or(*operands))
+            elif kind == ">":
+                stack.append(Implication(stack.pop(), stack.pop()))
+            elif kind == "=":
+                stack.append(Biconditional(stack.pop(), stack.pop()))
+            elif kind == "T" or kind == "F":
+                stack.append(TRUE if kind == "T" else FALSE)
+            else:
+                raise ValueError(f"unknown token {token}")
+        if len(stack) != 1:
+            raise ValueError(f"malformed sentence {line}")
+        knowledge.add(stack.pop())
+    return knowledge
+
+
+def dump(knowledge, filename):
+    """Writes a serialized knowledge base to a file."""
+    with open(filename, "w") as f:
+        f.write(dumps(knowledge))
+
+
+def load(filename):
+    """Reads a serialized knowledge base from a file."""
+    with open(filename) as f:
+        return loads(f.read())
@@ -113,8 +113,10 @@ def main():
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
+            simplified = simplify(knowledge)
+            print(f"    ({knowledge.size()} -> {simplified.size()} nodes)")
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if model_check(simplified, symbol):
                     print(f"    {symbol}")
 
 
@@ -1,6 +1,17 @@
 import itertools
+import math
 import random
-import copy
+import time
+from collections import defaultdict, deque
+from functools import cached_property
+
+import numpy
+
+
+# Positions of the eight neighbors of a cell, relative to it
+NEIGHBOR_OFFSETS = [
+    (di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if (di, dj) != (0, 0)
+]
 
 
 class Minesweeper():
@@ -8,32 +19,52 @@ class Minesweeper():
     Minesweeper game representation
     """
 
-    def __init__(self, height=8, width=8, mines=8):
+    def __init__(self, height=8, width=8, mines=8, seed=None):
 
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Place mines at random positions of the flattened field, where cell
+        # (i, j) is position i * width + j, drawing again only as many as
+        # landed on taken positions. On fields more than half full of mines,
+        # the empty cells are placed instead.
+        rng = numpy.random.default_rng(seed)
+        cells = height * width
+        dense = 2 * mines > cells
+        target = cells - mines if dense else mines
+        grid = numpy.zeros(cells, dtype=numpy.uint8)
+        placed = 0
+        while placed < target:
+            grid[rng.integers(cells, size=target - placed)] = 1
+            placed = numpy.count_nonzero(grid)
+        if dense:
+            grid ^= 1
+        grid = grid.reshape(height, width)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Field of one byte per cell, 1 where there is a mine
+        self.board = bytearray(grid)
 
         # At first, player has found no mines
         self.mines_found = set()
 
+        # Count the mines around every cell at once, by adding up the
+        # mine grid shifted in each of the eight directions
+        grid = numpy.pad(grid, 1)
+        self.counts = numpy.zeros((height, width), dtype=numpy.uint8)
+        for di, dj in NEIGHBOR_OFFSETS:
+            self.counts += grid[1 + di:1 + di + height, 1 + dj:1 + dj + width]
+
+        # Cells revealed so far
+        self.revealed = numpy.zeros((height, width), dtype=bool)
+
+    @cached_property
+    def mines(self):
+        """Set of cells with mines, built on first use."""
+        positions = numpy.flatnonzero(numpy.frombuffer(self.board, numpy.uint8))
+        rows, cols = numpy.divmod(positions, self.width)
+        return set(zip(rows.tolist(), cols.tolist()))
+
     def print(self):
         """
         Prints a text-based representation
@@ -42,7 +73,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.board[i * self.width + j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -51,7 +82,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return self.board[i * self.width + j] == 1
 
     def nearby_mines(self, cell):
         """
@@ -59,24 +90,48 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        return int(self.counts[cell])
 
-        # Keep count of nearby mines
-        count = 0
+    def reveal(self, cell):
+        """
+        Reveals a safe cell and, if no mines are near it, the whole region
+        around it that can be opened without touching a mine: every
+        connected cell with no nearby mines and the cells bordering them.
+        Returns a list of the cells newly revealed.
+        """
+        if self.is_mine(cell) or self.revealed[cell]:
+            return []
 
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
+        # Work on copies padded with a border of revealed cells, so that
+        # neighbors are found by adding offsets to flat positions
+        width = self.width + 2
+        revealed = numpy.ones((self.height + 2, width), dtype=bool)
+        revealed[1:-1, 1:-1] = self.revealed
+        revealed = revealed.reshape(-1)
+        counts = numpy.pad(self.counts, 1).reshape(-1)
+        offsets = numpy.array([di * width + dj for di, dj in NEIGHBOR_OFFSETS])
 
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
+        # Breadth-first search, one whole frontier at a time, where each
+        # cell found is stamped with its position to drop duplicates
+        frontier = numpy.array([(cell[0] + 1) * width + cell[1] + 1])
+        revealed[frontier] = True
+        found = [frontier]
+        stamps = numpy.empty(counts.size, dtype=numpy.int64)
+        while frontier.size:
+            zeros = frontier[counts[frontier] == 0]
+            frontier = (zeros[:, None] + offsets).ravel()
+            frontier = frontier[~revealed[frontier]]
+            positions = numpy.arange(frontier.size)
+            stamps[frontier] = positions
+            frontier = frontier[stamps[frontier] == positions]
+            revealed[frontier] = True
+            found.append(frontier)
 
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        rows, cols = numpy.divmod(numpy.concatenate(found), width)
+        self.revealed[rows - 1, cols - 1] = True
+        rows -= 1
+        cols -= 1
+        return list(zip(rows.tolist(), cols.tolist()))
 
     def won(self):
         """
@@ -99,6 +154,9 @@ class Sentence():
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        return hash((frozenset(self.cells), self.count))
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
@@ -140,17 +198,65 @@ class Sentence():
             self.cells.remove(cell)
 
 
+class CellPool():
+    """
+    Set of cells with constant time insertion, removal
+    and uniform random sampling.
+    """
+
+    def __init__(self, cells=()):
+        self.cells = list(cells)
+        self.positions = {cell: i for i, cell in enumerate(self.cells)}
+
+    def __contains__(self, cell):
+        return cell in self.positions
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, cell):
+        if cell not in self.positions:
+            self.positions[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def discard(self, cell):
+        """Removes a cell by moving the last cell into its place."""
+        position = self.positions.pop(cell, None)
+        if position is None:
+            return
+        last = self.cells.pop()
+        if position < len(self.cells):
+            self.cells[position] = last
+            self.positions[last] = position
+
+    def last(self):
+        """Returns the most recently placed cell."""
+        return self.cells[-1]
+
+    def sample(self):
+        """Returns a cell chosen uniformly at random."""
+        return random.choice(self.cells)
+
+
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, time_budget=0.1):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Total number of mines on the board, if known, and the time in
+        # seconds that guessing may spend on computing mine probabilities
+        self.total_mines = mines
+        self.time_budget = time_budget
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -158,8 +264,25 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Cells that could still be played, and known safes not yet played
+        self.candidates = CellPool(
+            (i, j) for i in range(height) for j in range(width)
+        )
+        self.unplayed_safes = CellPool()
+
+        # Set of sentences about the game known to be true
+        self.knowledge = set()
+
+        # Sentences mentioning each cell, and sentences left to infer from
+        self.cell_sentences = defaultdict(set)
+        self.pending = deque()
+
+        # Work done by the inference fixpoint of each call to add_knowledge
+        self.stats = []
+        self.work = None
+
+        # Mine configurations of frontier components, keyed by sentences
+        self.solutions = dict()
 
     def mark_mine(self, cell):
         """
@@ -167,8 +290,11 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self.candidates.discard(cell)
+        for sentence in self.cell_sentences.pop(cell, set()):
+            self.remove_sentence(sentence)
             sentence.mark_mine(cell)
+            self.add_sentence(sentence)
 
     def mark_safe(self, cell):
         """
@@ -176,8 +302,12 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        if cell not in self.moves_made:
+            self.unplayed_safes.add(cell)
+        for sentence in self.cell_sentences.pop(cell, set()):
+            self.remove_sentence(sentence)
             sentence.mark_safe(cell)
+            self.add_sentence(sentence)
 
     def add_knowledge(self, cell, count):
         """
@@ -194,59 +324,116 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
+        self.work = {
+            "sentences": 0,
+            "comparisons": 0,
+            "derived": 0,
+            "duplicates": 0,
+            "purged": 0
+        }
+
         # 1) & 2)
         self.moves_made.add(cell)
+        self.candidates.discard(cell)
+        self.unplayed_safes.discard(cell)
         self.mark_safe(cell)
 
         # 3)
         cellX, cellY = cell[0], cell[1]
         neigbours = set()
         # Find all adjacent cells
-        for i in range(cellX - 1, cellX + 2):
-            for j in range(cellY - 1, cellY + 2):
-                if i in range(self.height) and j in range(self.width):
-                    if (i, j) in self.mines:
-                        count -= 1
-                    
-                    if (i, j) not in self.mines and (i, j) not in self.safes:
-                        neigbours.add((i, j))
-
-        sentence = Sentence(neigbours, count)
-
-        if len(sentence.cells) > 0 and sentence not in self.knowledge:
-            self.knowledge.append(sentence)
-        
-        # 4)
-        for sentence in self.knowledge:
-            self.add_new_cells(sentence)
-        
-        # 5)
-        for firstSentence in self.knowledge:
-            for secondSentence in self.knowledge:
-                if firstSentence.cells.issubset(secondSentence.cells):
-                    newCells = secondSentence.cells - firstSentence.cells
-                    newCount = secondSentence.count - firstSentence.count
-                elif secondSentence.cells.issubset(firstSentence.cells):
-                    newCells = firstSentence.cells - secondSentence.cells
-                    newCount = firstSentence.count - secondSentence.count
-                
-                sentence = Sentence(newCells, newCount)
-                self.add_new_cells(sentence)
-
-    def add_new_cells(self, sentence):
-        """
-        Adds cells to either mine or safe
-        """
-        mines = copy.deepcopy(sentence.known_mines())
-        safes = copy.deepcopy(sentence.known_safes())
-
-        if mines:
-            for cell in mines:
-                self.mark_mine(cell)
-            
-        if safes:
-            for cell in safes:
-                self.mark_safe(cell)
+        for i in range(max(cellX - 1, 0), min(cellX + 2, self.height)):
+            for j in range(max(cellY - 1, 0), min(cellY + 2, self.width)):
+                if (i, j) in self.mines:
+                    count -= 1
+                elif (i, j) not in self.safes:
+                    neigbours.add((i, j))
+
+        self.add_sentence(Sentence(neigbours, count))
+
+        # 4) & 5)
+        self.infer()
+        self.stats.append(self.work)
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base and the cell index, unless
+        it is empty or already known, and queues it for inference.
+        """
+        if not sentence.cells:
+            self.count_work("purged")
+            return
+        if sentence in self.knowledge:
+            self.count_work("duplicates")
+            return
+
+        self.knowledge.add(sentence)
+        for cell in sentence.cells:
+            self.cell_sentences[cell].add(sentence)
+        self.pending.append(sentence)
+
+    def remove_sentence(self, sentence):
+        """
+        Removes a sentence from the knowledge base and the cell index,
+        which must happen before the sentence is changed.
+        """
+        self.knowledge.discard(sentence)
+        for cell in sentence.cells:
+            if cell in self.cell_sentences:
+                self.cell_sentences[cell].discard(sentence)
+
+    def count_work(self, kind, amount=1):
+        """Adds to the work counters of the current fixpoint, if any."""
+        if self.work is not None:
+            self.work[kind] += amount
+
+    def infer(self):
+        """
+        Runs inference to a fixpoint, working through the pending sentences
+        until none are left. Each one either decides some cells as mines or
+        safes, or is compared against the sentences sharing a cell with it
+        to derive new ones. Marking a cell re-queues every sentence touching
+        it, so only sentences around changed cells are revisited.
+        """
+        while self.pending:
+            sentence = self.pending.popleft()
+
+            # Skip sentences since changed, merged into a duplicate or emptied
+            if not sentence.cells or sentence not in self.knowledge:
+                continue
+            self.count_work("sentences")
+
+            # 4) Mark cells that this sentence alone decides
+            mines = list(sentence.known_mines())
+            safes = list(sentence.known_safes())
+            if mines or safes:
+                for cell in mines:
+                    self.mark_mine(cell)
+                for cell in safes:
+                    self.mark_safe(cell)
+                continue
+
+            # 5) Subset inference against sentences sharing a cell
+            related = {
+                id(other): other
+                for cell in sentence.cells
+                for other in self.cell_sentences[cell]
+                if other is not sentence
+            }
+            self.count_work("comparisons", len(related))
+            for other in related.values():
+                if sentence.cells < other.cells:
+                    self.count_work("derived")
+                    self.add_sentence(Sentence(
+                        other.cells - sentence.cells,
+                        other.count - sentence.count
+                    ))
+                elif other.cells < sentence.cells:
+                    self.count_work("derived")
+                    self.add_sentence(Sentence(
+                        sentence.cells - other.cells,
+                        sentence.count - other.count
+                    ))
 
     def make_safe_move(self):
         """
@@ -257,9 +444,8 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for cell in self.safes:
-            if cell not in self.moves_made:
-                return cell
+        if self.unplayed_safes:
+            return self.unplayed_safes.last()
 
         return None
 
@@ -269,15 +455,641 @@ class MinesweeperAI():
         Should choose randomly among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        Only the cells least likely to be a mine are chosen among.
         """
-        possibleMoves = []
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i, j) not in self.moves_made and (i, j) not in self.mines:
-                    possibleMoves.append((i, j))
+        probabilities, other = self.mine_probabilities()
+        unconstrained = self.unknown_count() - len(probabilities)
 
-        if len(possibleMoves) != 0:
-            randomMove = random.randrange(len(possibleMoves))
-            return possibleMoves[randomMove]
-    
-        return None
+        lowest = min(probabilities.values(), default=1)
+        if unconstrained:
+            lowest = min(lowest, other)
+        choices = [
+            cell for cell, p in probabilities.items()
+            if p <= lowest + 1e-9
+        ]
+        if not unconstrained or other > lowest + 1e-9:
+            unconstrained = 0
+
+        # Pick uniformly among the frontier choices and unconstrained cells
+        pick = random.randrange(len(choices) + unconstrained or 1)
+        if pick < len(choices):
+            return choices[pick]
+        if not unconstrained:
+            return None
+
+        # Sample unconstrained cells by rejection while they are common
+        if 2 * unconstrained >= len(self.candidates):
+            while True:
+                cell = self.candidates.sample()
+                if (cell not in probabilities
+                        and cell not in self.unplayed_safes):
+                    return cell
+        return random.choice([
+            cell for cell in self.candidates
+            if cell not in probabilities and cell not in self.unplayed_safes
+        ])
+
+    def unknown_count(self):
+        """Returns how many unplayed cells are not known mines or safes."""
+        return len(self.candidates) - len(self.unplayed_safes)
+
+    def mine_probabilities(self):
+        """
+        Returns a pair (probabilities, other), where `probabilities` maps
+        each frontier cell (any cell in a sentence) to the probability that
+        it is a mine, and `other` is that probability for every other cell
+        that is still unknown.
+
+        The frontier is split into independent components whose consistent
+        mine configurations are counted by number of mines. Weighting them by
+        the ways to place the remaining mines among the other cells gives
+        exact probabilities. Components that cannot be counted within half
+        the time budget are estimated by sampling for the other half.
+        """
+        start = time.perf_counter()
+        components = self.frontier_components()
+
+        results = []
+        solutions = dict()
+        for cells, sentences in components:
+            key = frozenset(sentences)
+            result = self.solutions.get(key)
+            if result is None:
+                result = count_configurations(
+                    cells, sentences, start + self.time_budget / 2
+                )
+            if result is None:
+                budget = self.time_budget / 2 / len(components)
+                result = sample_configurations(
+                    cells, sentences, time.perf_counter() + budget
+                )
+            solutions[key] = result
+            results.append(result)
+        self.solutions = solutions
+
+        frontier = sum(len(cells) for cells, _ in components)
+        remaining = self.unknown_count() - frontier
+        left = None
+        if self.total_mines is not None:
+            left = self.total_mines - len(self.mines)
+
+        # Scale each component's counts to a distribution, so that products
+        # over many components stay within floating point range
+        scaled = []
+        for ways, mine_ways in results:
+            size = sum(ways.values())
+            scaled.append((
+                {k: w / size for k, w in ways.items()},
+                {
+                    cell: {k: w / size for k, w in cell_ways.items()}
+                    for cell, cell_ways in mine_ways.items()
+                }
+            ))
+        results = scaled
+
+        # Mine count distributions of all components but one
+        prefixes = [{0: 1}]
+        for ways, _ in results:
+            prefixes.append(convolve(prefixes[-1], ways))
+        suffixes = [{0: 1}]
+        for ways, _ in reversed(results):
+            suffixes.append(convolve(suffixes[-1], ways))
+        suffixes.reverse()
+        total = prefixes[-1]
+
+        def log_ways(k):
+            """Log of the ways to place the other mines, given k here."""
+            if 0 <= left - k <= remaining:
+                return (math.lgamma(remaining + 1) - math.lgamma(left - k + 1)
+                        - math.lgamma(remaining - left + k + 1))
+            return -math.inf
+
+        # Relative weights of each number of frontier mines
+        weights = {k: 1.0 for k in total}
+        if left is not None:
+            weights = {k: log_ways(k) for k in total}
+            scale = max(weights.values())
+            weights = {k: math.exp(w - scale) for k, w in weights.items()}
+        norm = sum(w * weights[k] for k, w in total.items())
+        if norm == 0:
+
+            # Sampled components can be inconsistent with the mine count
+            left = None
+            weights = {k: 1.0 for k in total}
+            norm = sum(total.values())
+
+        probabilities = dict()
+        for c, (cells, _) in enumerate(components):
+            others = convolve(prefixes[c], suffixes[c + 1])
+            _, mine_ways = results[c]
+            completions = dict()
+            for cell in cells:
+                p = 0
+                for k, w in mine_ways[cell].items():
+                    if k not in completions:
+                        completions[k] = sum(
+                            wo * weights.get(k + ko, 0)
+                            for ko, wo in others.items()
+                        )
+                    p += w * completions[k]
+                probabilities[cell] = p / norm
+
+        # Without a mine count, assume the frontier's mine density elsewhere
+        if not remaining:
+            other = None
+        elif left is None:
+            other = sum(probabilities.values()) / max(len(probabilities), 1)
+        else:
+            other = sum(
+                w * weights[k] * (left - k) for k, w in total.items()
+            ) / (norm * remaining)
+        return probabilities, other
+
+    def frontier_components(self):
+        """
+        Splits the cells mentioned by sentences into components that share
+        no sentence. Returns a list of (cells, sentences) pairs, with cells
+        in breadth-first order so that each sentence spans few positions.
+        """
+        components = []
+        seen = set()
+        for start in self.cell_sentences:
+            if start in seen or not self.cell_sentences[start]:
+                continue
+            seen.add(start)
+            cells = [start]
+            sentences = set()
+            queue = deque([start])
+            while queue:
+                cell = queue.popleft()
+                for sentence in self.cell_sentences[cell]:
+                    if sentence in sentences:
+                        continue
+                    sentences.add(sentence)
+                    for neighbor in sentence.cells:
+                        if neighbor not in seen:
+                            seen.add(neighbor)
+                            cells.append(neighbor)
+                            queue.append(neighbor)
+            components.append((cells, sentences))
+        return components
+
+
+class BitsetMinesweeperAI(MinesweeperAI):
+    """
+    Minesweeper game player that stores sets of cells as integers.
+
+    Cell (i, j) is bit i * width + j. Sentences are (cells, count) pairs
+    of a bitset and a mine count, so subset tests and differences are
+    single integer operations. Cells are still passed in and returned as
+    (i, j) tuples, and mines, safes and moves_made are available as sets.
+    """
+
+    def __init__(self, height=8, width=8, mines=None, time_budget=0.1):
+
+        # Set initial height and width
+        self.height = height
+        self.width = width
+        self.total_mines = mines
+        self.time_budget = time_budget
+
+        # Bitsets of cells clicked on, and cells known to be safe or mines
+        self.moves_mask = 0
+        self.mine_mask = 0
+        self.safe_mask = 0
+
+        # Set of (cells, count) sentences, indexed by the bits they contain
+        self.knowledge = set()
+        self.cell_sentences = dict()
+        self.pending = deque()
+
+        self.stats = []
+        self.work = None
+        self.solutions = dict()
+
+        # Neighbors of each column in a three row band, shifted into place
+        # for a given row; the top and bottom rows are clipped on use
+        self.columns = []
+        for j in range(width):
+            row = 0
+            for k in range(max(j - 1, 0), min(j + 2, width)):
+                row |= 1 << k
+            self.columns.append(row | row << width | row << 2 * width)
+        self.row_mask = (1 << width) - 1
+
+    @property
+    def moves_made(self):
+        return self.cells(self.moves_mask)
+
+    @property
+    def mines(self):
+        return self.cells(self.mine_mask)
+
+    @property
+    def safes(self):
+        return self.cells(self.safe_mask)
+
+    def cells(self, mask):
+        """Returns the set of (i, j) cells in a bitset."""
+        return {divmod(bit, self.width) for bit in bits(mask)}
+
+    def bit(self, cell):
+        """Returns the bit number of an (i, j) cell."""
+        return cell[0] * self.width + cell[1]
+
+    def neighbors(self, cell):
+        """Returns the bitset of cells adjacent to an (i, j) cell."""
+        i, j = cell
+        band = self.columns[j] & ~(1 << (self.width + j))
+        if i == 0:
+            band >>= self.width
+        else:
+            band <<= (i - 1) * self.width
+        if i == self.height - 1:
+            band &= (1 << self.height * self.width) - 1
+        return band
+
+    def mark_mine(self, cell):
+        """
+        Marks a cell as a mine, and updates all knowledge
+        to mark that cell as a mine as well.
+        """
+        self.mark(self.bit(cell), True)
+
+    def mark_safe(self, cell):
+        """
+        Marks a cell as safe, and updates all knowledge
+        to mark that cell as safe as well.
+        """
+        self.mark(self.bit(cell), False)
+
+    def mark(self, bit, mine):
+        """Marks bit `bit` as a mine or as safe, updating all sentences."""
+        flag = 1 << bit
+        if mine:
+            self.mine_mask |= flag
+        else:
+            self.safe_mask |= flag
+        for cells, count in self.cell_sentences.pop(bit, set()):
+            self.remove_sentence((cells, count))
+            self.add_sentence((cells & ~flag, count - mine))
+
+    def add_knowledge(self, cell, count):
+        """
+        Called when the Minesweeper board tells us, for a given
+        safe cell, how many neighboring cells have mines in them.
+        Works as MinesweeperAI.add_knowledge does, on bitsets.
+        """
+        self.work = {
+            "sentences": 0,
+            "comparisons": 0,
+            "derived": 0,
+            "duplicates": 0,
+            "purged": 0
+        }
+
+        bit = self.bit(cell)
+        self.moves_mask |= 1 << bit
+        self.mark(bit, False)
+
+        neighbors = self.neighbors(cell)
+        count -= (neighbors & self.mine_mask).bit_count()
+        cells = neighbors & ~self.mine_mask & ~self.safe_mask
+        self.add_sentence((cells, count))
+
+        self.infer()
+        self.stats.append(self.work)
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base and the bit index, unless
+        it is empty or already known, and queues it for inference.
+        """
+        if not sentence[0]:
+            self.count_work("purged")
+            return
+        if sentence in self.knowledge:
+            self.count_work("duplicates")
+            return
+
+        self.knowledge.add(sentence)
+        for bit in bits(sentence[0]):
+            self.cell_sentences.setdefault(bit, set()).add(sentence)
+        self.pending.append(sentence)
+
+    def remove_sentence(self, sentence):
+        """Removes a sentence from the knowledge base and the bit index."""
+        self.knowledge.discard(sentence)
+        for bit in bits(sentence[0]):
+            if bit in self.cell_sentences:
+                self.cell_sentences[bit].discard(sentence)
+
+    def infer(self):
+        """
+        Runs inference to a fixpoint, as MinesweeperAI.infer does, with
+        subset tests and differences done on bitsets.
+        """
+        while self.pending:
+            sentence = self.pending.popleft()
+            if sentence not in self.knowledge:
+                continue
+            self.count_work("sentences")
+            cells, count = sentence
+
+            # Mark cells that this sentence alone decides
+            if count == 0 or count == cells.bit_count():
+                for bit in bits(cells):
+                    self.mark(bit, count != 0)
+                continue
+
+            # Subset inference against sentences sharing a cell
+            related = set()
+            for bit in bits(cells):
+                related |= self.cell_sentences[bit]
+            related.discard(sentence)
+            self.count_work("comparisons", len(related))
+            for other_cells, other_count in related:
+                if cells & other_cells == cells:
+                    self.count_work("derived")
+                    self.add_sentence((other_cells ^ cells,
+                                       other_count - count))
+                elif cells & other_cells == other_cells:
+                    self.count_work("derived")
+                    self.add_sentence((cells ^ other_cells,
+                                       count - other_count))
+
+    def make_safe_move(self):
+        """
+        Returns a safe cell to choose on the Minesweeper board.
+        The move must be known to be safe, and not already a move
+        that has been made.
+        """
+        unplayed = self.safe_mask & ~self.moves_mask
+        if not unplayed:
+            return None
+        return divmod((unplayed & -unplayed).bit_length() - 1, self.width)
+
+    def unknown_count(self):
+        """Returns how many unplayed cells are not known mines or safes."""
+        board = (1 << self.height * self.width) - 1
+        return (board & ~self.moves_mask & ~self.mine_mask
+                & ~self.safe_mask).bit_count()
+
+    def make_random_move(self):
+        """
+        Returns a move to make on the Minesweeper board, choosing among the
+        cells least likely to be a mine as MinesweeperAI does.
+        """
+        probabilities, other = self.mine_probabilities()
+
+        frontier = 0
+        for cell in probabilities:
+            frontier |= 1 << self.bit(cell)
+        board = (1 << self.height * self.width) - 1
+        unconstrained = (board & ~self.moves_mask & ~self.mine_mask
+                         & ~frontier)
+
+        lowest = min(probabilities.values(), default=1)
+        if unconstrained:
+            lowest = min(lowest, other)
+        choices = [
+            cell for cell, p in probabilities.items()
+            if p <= lowest + 1e-9
+        ]
+        count = unconstrained.bit_count()
+        if other is None or other > lowest + 1e-9:
+            count = 0
+
+        # Pick uniformly among the frontier choices and unconstrained cells,
+        # finding an unconstrained cell by its rank among the set bits
+        if not choices and not count:
+            return None
+        pick = random.randrange(len(choices) + count)
+        if pick < len(choices):
+            return choices[pick]
+        return divmod(select_bit(unconstrained, pick - len(choices)),
+                      self.width)
+
+    def frontier_components(self):
+        """
+        Returns the components of the frontier as MinesweeperAI does, with
+        bitset sentences converted to Sentence objects of (i, j) cells.
+        """
+        components = []
+        seen = set()
+        for start in self.cell_sentences:
+            if start in seen or not self.cell_sentences[start]:
+                continue
+            seen.add(start)
+            order = [start]
+            sentences = set()
+            queue = deque([start])
+            while queue:
+                bit = queue.popleft()
+                for sentence in self.cell_sentences[bit]:
+                    if sentence in sentences:
+                        continue
+                    sentences.add(sentence)
+                    for neighbor in bits(sentence[0]):
+                        if neighbor not in seen:
+                            seen.add(neighbor)
+                            order.append(neighbor)
+                            queue.append(neighbor)
+            components.append((
+                [divmod(bit, self.width) for bit in order],
+                {
+                    Sentence(self.cells(cells), count)
+                    for cells, count in sentences
+                }
+            ))
+        return components
+
+
+def bits(mask):
+    """Yields the numbers of the bits set in a bitset, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def select_bit(mask, rank):
+    """
+    Returns the number of the set bit in a bitset with `rank` set bits
+    below it, halving the bitset by population count until it fits in a
+    machine word.
+    """
+    offset = 0
+    while mask.bit_length() > 64:
+        half = mask.bit_length() // 2
+        low = mask & ((1 << half) - 1)
+        below = low.bit_count()
+        if rank < below:
+            mask = low
+        else:
+            rank -= below
+            mask >>= half
+            offset += half
+    for bit in bits(mask):
+        if not rank:
+            return offset + bit
+        rank -= 1
+    raise ValueError("rank out of range")
+
+
+def convolve(a, b):
+    """Combines two distributions of ways by number of mines."""
+    result = dict()
+    for ka, wa in a.items():
+        for kb, wb in b.items():
+            result[ka + kb] = result.get(ka + kb, 0) + wa * wb
+    return result
+
+
+def constraint_layout(cells, sentences):
+    """
+    Returns, for cells in the given order, the count of each sentence and
+    for each position the (sentence, cells left after it) pairs of the
+    sentences containing that cell.
+    """
+    position = {cell: i for i, cell in enumerate(cells)}
+    counts = []
+    after = [[] for _ in cells]
+    for c, sentence in enumerate(sentences):
+        positions = sorted(position[cell] for cell in sentence.cells)
+        counts.append(sentence.count)
+        for rank, i in enumerate(positions):
+            after[i].append((c, len(positions) - rank - 1))
+    return counts, after
+
+
+def count_configurations(cells, sentences, deadline):
+    """
+    Counts the mine configurations of `cells` consistent with `sentences`.
+
+    Returns a pair (ways, mine_ways) where ways[k] is the number of
+    configurations with k mines and mine_ways[cell][k] the number of those
+    in which `cell` is a mine, or None if the deadline passes first.
+
+    Cells are assigned in order, memoizing on the outstanding counts of
+    the sentences that are partly assigned, so configurations that agree
+    on those counts are counted together.
+    """
+    sentences = list(sentences)
+    counts, after = constraint_layout(cells, sentences)
+    n = len(cells)
+
+    # Sentences partly assigned before each position
+    active = [[]]
+    for i in range(n):
+        starting = {c for c, left in after[i] if left}
+        ending = {c for c, left in after[i] if not left}
+        active.append(sorted((set(active[i]) | starting) - ending))
+
+    def step(i, state, value):
+        """Returns the state after assigning `value` to cell i, if valid."""
+        need = dict(zip(active[i], state))
+        for c, left in after[i]:
+            remaining = need.get(c, counts[c]) - value
+            if remaining < 0 or remaining > left:
+                return None
+            need[c] = remaining
+        return tuple(need[c] for c in active[i + 1])
+
+    # Ways to assign each prefix, by state and number of mines
+    forward = [{(): {0: 1}}]
+    transitions = []
+    for i in range(n):
+        if time.perf_counter() > deadline:
+            return None
+        layer = dict()
+        moves = dict()
+        for state, ways in forward[i].items():
+            moves[state] = (step(i, state, 0), step(i, state, 1))
+            for value, following in enumerate(moves[state]):
+                if following is None:
+                    continue
+                target = layer.setdefault(following, dict())
+                for k, w in ways.items():
+                    target[k + value] = target.get(k + value, 0) + w
+        forward.append(layer)
+        transitions.append(moves)
+
+    # Ways to complete each suffix, by state and number of mines
+    backward = [None] * n + [{(): {0: 1}}]
+    for i in range(n - 1, -1, -1):
+        if time.perf_counter() > deadline:
+            return None
+        layer = dict()
+        for state, moves in transitions[i].items():
+            ways = dict()
+            for value, following in enumerate(moves):
+                for k, w in backward[i + 1].get(following, {}).items():
+                    ways[k + value] = ways.get(k + value, 0) + w
+            if ways:
+                layer[state] = ways
+        backward[i] = layer
+
+    mine_ways = dict()
+    for i, cell in enumerate(cells):
+        ways = dict()
+        for state, prefix in forward[i].items():
+            suffix = backward[i + 1].get(transitions[i][state][1], {})
+            for k, w in convolve(prefix, suffix).items():
+                ways[k + 1] = ways.get(k + 1, 0) + w
+        mine_ways[cell] = ways
+    return backward[0].get((), {}), mine_ways
+
+
+def sample_configurations(cells, sentences, deadline):
+    """
+    Estimates the result of `count_configurations` for components too large
+    to count, by sequential importance sampling until the deadline.
+
+    Each sample assigns the cells in order, tossing a coin only where both
+    values keep every sentence satisfiable and taking the only one
+    otherwise. A sample that reaches a cell with neither is discarded, and
+    every other is weighted by the inverse of the probability of drawing
+    it, 2 to the number of tosses, so that the weights are unbiased
+    estimates of the counts.
+    """
+    counts, after = constraint_layout(cells, list(sentences))
+    n = len(cells)
+    ways = dict()
+    mine_ways = {cell: dict() for cell in cells}
+
+    while time.perf_counter() < deadline:
+        need = counts.copy()
+        mines = []
+        w = 1
+        for i in range(n):
+            allowed = [
+                value for value in (0, 1)
+                if all(0 <= need[c] - value <= left for c, left in after[i])
+            ]
+            if not allowed:
+                break
+            value = allowed[0]
+            if len(allowed) == 2:
+                value = random.getrandbits(1)
+                w *= 2
+            for c, _ in after[i]:
+                need[c] -= value
+            if value:
+                mines.append(cells[i])
+        else:
+            k = len(mines)
+            ways[k] = ways.get(k, 0) + w
+            for cell in mines:
+                mine_ways[cell][k] = mine_ways[cell].get(k, 0) + w
+
+    # Without any sample, estimate each cell from its densest sentence
+    if not ways:
+        for cell in cells:
+            p = max(
+                sentence.count / len(sentence.cells)
+                for sentence in sentences if cell in sentence.cells
+            )
+            mine_ways[cell] = {0: p}
+        ways = {0: 1}
+    return ways, mine_ways
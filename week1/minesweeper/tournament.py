@@ -0,0 +1,223 @@
+import argparse
+import multiprocessing
+import random
+import statistics
+import time
+
+from minesweeper import (
+    Minesweeper, MinesweeperAI, BitsetMinesweeperAI,
+    count_configurations, sample_configurations
+)
+
+PLAYERS = {
+    "sets": MinesweeperAI,
+    "bitset": BitsetMinesweeperAI
+}
+
+
+def play_game(game_settings):
+    """
+    Plays one seeded game without a display.
+
+    Returns a tuple (won, guesses, times, guess_times) where `guesses` is
+    the number of moves made without a known safe cell, `times` lists the
+    seconds spent on each move, choosing it and adding its knowledge, and
+    `guess_times` the seconds spent in make_random_move for each guess.
+    """
+    height, width, mines, player, seed = game_settings
+
+    # Seed the board, and the global generator used by the AI
+    random.seed(seed)
+    game = Minesweeper(height=height, width=width, mines=mines, seed=seed)
+    ai = PLAYERS[player](height=height, width=width, mines=mines)
+
+    guesses = 0
+    times = []
+    guess_times = []
+    played = 0
+    while True:
+
+        # The game is won once every safe cell is played, even if some
+        # mines could never be told apart from each other
+        if played == height * width - mines:
+            return True, guesses, times, guess_times
+
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            guessing = time.perf_counter()
+            move = ai.make_random_move()
+            guess_times.append(time.perf_counter() - guessing)
+            if move is None:
+                return ai.mines == game.mines, guesses, times, guess_times
+            guesses += 1
+
+        if game.is_mine(move):
+            return False, guesses, times, guess_times
+
+        ai.add_knowledge(move, game.nearby_mines(move))
+        times.append(time.perf_counter() - start)
+        played += 1
+
+
+def component_probabilities(result):
+    """
+    Returns each cell's probability of being a mine within its component,
+    from the result of counting or sampling its configurations.
+    """
+    ways, mine_ways = result
+    total = sum(ways.values())
+    return {
+        cell: sum(cell_ways.values()) / total
+        for cell, cell_ways in mine_ways.items()
+    }
+
+
+def check_sampling(game_settings):
+    """
+    Plays one seeded game like `play_game`, and before every guess
+    compares sample_configurations, given `budget` seconds, with
+    count_configurations on each frontier component it counts within a
+    second.
+
+    Returns a list of (cells, error) pairs, one for each component
+    compared, where `error` is the largest difference between the
+    sampled and exact probability of one of its cells being a mine.
+    """
+    height, width, mines, player, seed, budget = game_settings
+    random.seed(seed)
+    game = Minesweeper(height=height, width=width, mines=mines, seed=seed)
+    ai = PLAYERS[player](height=height, width=width, mines=mines)
+
+    errors = []
+    while True:
+        move = ai.make_safe_move()
+        if move is None:
+            for cells, sentences in ai.frontier_components():
+                exact = count_configurations(
+                    cells, sentences, time.perf_counter() + 1
+                )
+                if exact is None:
+                    continue
+
+                # Sample without disturbing the moves the AI draws
+                state = random.getstate()
+                sampled = sample_configurations(
+                    cells, sentences, time.perf_counter() + budget
+                )
+                random.setstate(state)
+                exact = component_probabilities(exact)
+                sampled = component_probabilities(sampled)
+                errors.append((len(cells), max(
+                    abs(sampled[cell] - exact[cell]) for cell in cells
+                )))
+            move = ai.make_random_move()
+            if move is None:
+                return errors
+
+        if game.is_mine(move):
+            return errors
+        ai.add_knowledge(move, game.nearby_mines(move))
+
+
+def percentile(values, p):
+    """Returns the p-th percentile of a sorted list of values."""
+    if not values:
+        return 0
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play seeded Minesweeper games with the AI."
+    )
+    parser.add_argument("--height", type=int, default=16)
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--mines", type=int,
+                        help="number of mines (default: from --density)")
+    parser.add_argument("--density", type=float, default=0.2,
+                        help="fraction of cells that are mines")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first game; game k uses seed + k")
+    parser.add_argument("--player", choices=PLAYERS, default="sets")
+    parser.add_argument("--processes", type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--check-sampling", type=float, metavar="SECONDS",
+                        help="instead of reporting play, compare sampled "
+                             "with exact mine probabilities, sampling "
+                             "each frontier component for SECONDS")
+    args = parser.parse_args()
+
+    mines = args.mines
+    if mines is None:
+        mines = round(args.density * args.height * args.width)
+
+    if args.check_sampling is not None:
+        report_sampling(args, mines)
+        return
+
+    games = [
+        (args.height, args.width, mines, args.player, args.seed + k)
+        for k in range(args.games)
+    ]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(play_game, games, chunksize=8)
+    elapsed = time.perf_counter() - start
+
+    wins = sum(won for won, _, _, _ in results)
+    guesses = [g for _, g, _, _ in results]
+    times = sorted(t for _, _, game_times, _ in results for t in game_times)
+    guess_times = sorted(
+        t for _, _, _, game_times in results for t in game_times
+    )
+
+    print(f"{args.games} games of {args.height}x{args.width} "
+          f"with {mines} mines, {args.player} player, "
+          f"seeds {args.seed}..{args.seed + args.games - 1}")
+    print(f"  Win rate: {wins / args.games:.2%} ({wins}/{args.games})")
+    print(f"  Guesses per game: {statistics.mean(guesses):.2f} mean, "
+          f"{statistics.median(guesses)} median")
+    print(f"  Time per move, choosing and updating ({len(times)} moves, "
+          f"{sum(times):.2f} s):")
+    for p in (50, 90, 99):
+        print(f"    p{p}: {percentile(times, p) * 1000:.3f} ms")
+    print(f"    max: {percentile(times, 100) * 1000:.3f} ms")
+    print(f"  Time per guess, in make_random_move ({len(guess_times)} "
+          f"guesses, {sum(guess_times):.2f} s):")
+    for p in (50, 90, 99):
+        print(f"    p{p}: {percentile(guess_times, p) * 1000:.3f} ms")
+    print(f"    max: {percentile(guess_times, 100) * 1000:.3f} ms")
+    print(f"  Wall time: {elapsed:.2f} s")
+
+
+def report_sampling(args, mines):
+    """
+    Prints how far sampled mine probabilities are from exact ones, over
+    the frontier components of every game.
+    """
+    games = [
+        (args.height, args.width, mines, args.player, args.seed + k,
+         args.check_sampling)
+        for k in range(args.games)
+    ]
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(check_sampling, games)
+    components = [pair for errors in results for pair in errors]
+
+    print(f"{args.games} games of {args.height}x{args.width} "
+          f"with {mines} mines, {args.player} player, "
+          f"{args.check_sampling} s of sampling per component")
+    for label, smallest in (("All components", 1),
+                            ("Components of 15+ cells", 15)):
+        errors = sorted(e for cells, e in components if cells >= smallest)
+        print(f"  {label} ({len(errors)}), largest error "
+              f"in a cell's mine probability:")
+        for p in (50, 90):
+            print(f"    p{p}: {percentile(errors, p):.4f}")
+        print(f"    max: {percentile(errors, 100):.4f}")
+
+
+if __name__ == "__main__":
+    main()
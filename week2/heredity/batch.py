@@ -0,0 +1,89 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from elimination import GENES, conditional_tables, eliminate
+from heredity import PROBS, load_data
+
+# Probability tables shared by every family a process scores
+TABLES = conditional_tables(PROBS)
+
+# Columns of the output file, each an array with an entry per person
+COLUMNS = [
+    "family", "name",
+    *(f"gene_{gene}" for gene in GENES),
+    "trait_true", "trait_false"
+]
+
+
+def family_files(sources):
+    """
+    Returns the sorted family files named by `sources`, each of which
+    is a CSV file, a directory of CSV files, or a glob pattern.
+    """
+    files = set()
+    for source in sources:
+        if os.path.isdir(source):
+            files.update(glob.glob(os.path.join(source, "*.csv")))
+        else:
+            files.update(glob.glob(source))
+    return sorted(files)
+
+
+def score_family(filename):
+    """Returns the output rows of every person in the family file."""
+    people = load_data(filename)
+    probabilities = eliminate(people, PROBS, TABLES)
+    return [
+        [
+            filename, person,
+            *(probabilities[person]["gene"][gene] for gene in GENES),
+            probabilities[person]["trait"][True],
+            probabilities[person]["trait"][False]
+        ]
+        for person in people
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute gene and trait marginals of many families."
+    )
+    parser.add_argument("sources", nargs="+",
+                        help="family CSV files, directories or glob patterns")
+    parser.add_argument("--output", default="marginals.npz",
+                        help="NumPy .npz file to write, one array per "
+                             "column with an entry per person")
+    parser.add_argument("--processes", type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunksize", type=int, default=64,
+                        help="families sent to a worker at a time")
+    args = parser.parse_args()
+
+    files = family_files(args.sources)
+    if not files:
+        parser.error("no family files found")
+
+    start = time.perf_counter()
+    rows = []
+    with multiprocessing.Pool(args.processes) as pool:
+        for family in pool.imap(score_family, files,
+                                chunksize=args.chunksize):
+            rows.extend(family)
+    np.savez(args.output, **{
+        column: np.array(values)
+        for column, values in zip(COLUMNS, zip(*rows))
+    })
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {len(files)} families ({len(rows)} people) "
+          f"into {args.output} in {elapsed:.2f} s, "
+          f"{elapsed / len(files) * 1e6:.0f} us per family")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import itertools
+
+import numpy as np
+
+# Possible number of copies of the gene a person has
+GENES = (2, 1, 0)
+
+
+class Factor():
+    """
+    Table of non-negative values for every assignment of gene counts to
+    a tuple of people, as an array with one axis per person indexed by
+    their number of copies of the gene.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+    def normalized(self):
+        """
+        Returns this factor scaled so that its values sum to 1, or
+        unchanged if they are all 0.
+        """
+        total = self.table.sum()
+        if total == 0:
+            return self
+        return Factor(self.variables, self.table / total)
+
+
+def pedigree_order(people):
+    """
+    Returns the names in `people` ordered so that parents come before
+    their children.
+    """
+    order = []
+    placed = set()
+
+    def place(person):
+        if person is None or person in placed:
+            return
+        placed.add(person)
+        place(people[person]["mother"])
+        place(people[person]["father"])
+        order.append(person)
+
+    for person in people:
+        place(person)
+    return order
+
+
+def inheritance_table(mutation):
+    """
+    Returns an array `table` where table[child, mother, father] is the
+    probability that a child has `child` copies of the gene given the
+    gene counts of their parents.
+    """
+    passes = np.array([mutation, 0.5, 1 - mutation])
+    pm = passes[:, None]
+    pf = passes[None, :]
+    return np.stack([
+        (1 - pm) * (1 - pf),
+        pm * (1 - pf) + pf * (1 - pm),
+        pm * pf
+    ])
+
+
+def conditional_tables(probs):
+    """
+    Returns the probability tables of the network as arrays indexed by
+    gene counts: "gene" is the prior of people without parents,
+    "inheritance" is the result of `inheritance_table`, and "trait" maps
+    each trait value to its probability given the gene count. Factors
+    share these tables, so they can be built once for any number of
+    pedigrees.
+    """
+    return {
+        "gene": np.array([probs["gene"][gene] for gene in range(3)]),
+        "inheritance": inheritance_table(probs["mutation"]),
+        "trait": {
+            trait: np.array([
+                probs["trait"][gene][trait] for gene in range(3)
+            ])
+            for trait in (True, False)
+        }
+    }
+
+
+def pedigree_factors(people, probs, tables=None):
+    """
+    Returns the factors of the pedigree as a Bayesian network over the
+    gene count of each person: the gene prior of people without parents
+    and the inheritance probabilities of everyone else. Known traits are
+    evidence, added separately by `Family`.
+
+    `tables` are the result of `conditional_tables(probs)`, computed
+    here if not given.
+    """
+    if tables is None:
+        tables = conditional_tables(probs)
+
+    factors = []
+    for person in people:
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother is None and father is None:
+            factors.append(Factor((person,), tables["gene"]))
+        else:
+            factors.append(
+                Factor((person, mother, father), tables["inheritance"])
+            )
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Returns an order in which to eliminate the variables of `factors`,
+    greedily choosing the variable whose elimination adds the fewest
+    edges between its neighbors (min-fill), breaking ties by degree.
+    """
+    neighbors = dict()
+    for factor in factors:
+        for v in factor.variables:
+            neighbors.setdefault(v, set()).update(factor.variables)
+            neighbors[v].discard(v)
+
+    def fill(v):
+        adjacent = list(neighbors[v])
+        added = sum(
+            1 for a, b in itertools.combinations(adjacent, 2)
+            if b not in neighbors[a]
+        )
+        return (added, len(adjacent))
+
+    scores = {v: fill(v) for v in neighbors}
+    order = []
+    while scores:
+        v = min(scores, key=scores.get)
+        order.append(v)
+        del scores[v]
+
+        # Connect the neighbors of v, then rescore whoever that affected
+        adjacent = neighbors.pop(v)
+        for a in adjacent:
+            neighbors[a].discard(v)
+            neighbors[a].update(adjacent - {a})
+        affected = set(adjacent)
+        for a in adjacent:
+            affected.update(neighbors[a])
+        for a in affected:
+            scores[a] = fill(a)
+    return order
+
+
+class Family():
+    """
+    Exact inference over one pedigree that keeps its messages between
+    queries, so that observing or retracting a trait only recomputes the
+    messages that depend on it.
+
+    Eliminating variables in min-fill order builds a tree of clusters,
+    one per variable, with each eliminated sum passed up to the cluster
+    of the next variable it mentions. Messages passed back down give
+    every cluster the rest of the evidence. Both are computed when first
+    needed and cached. Messages are normalized as they are passed, which
+    leaves the marginals unchanged but keeps large pedigrees from
+    underflowing.
+    """
+
+    def __init__(self, people, probs, tables=None):
+        """
+        Builds the cluster tree of `people`, as returned by `load_data`,
+        observing every known trait. `tables` may be given to reuse the
+        result of `conditional_tables(probs)` across pedigrees.
+        """
+        if tables is None:
+            tables = conditional_tables(probs)
+        self.probs = probs
+        self.tables = tables
+        self.traits = {
+            person: people[person]["trait"] for person in people
+            if people[person]["trait"] is not None
+        }
+
+        factors = pedigree_factors(people, probs, tables)
+        order = elimination_order(factors)
+        self.position = {v: i for i, v in enumerate(order)}
+
+        # Assign each factor to the cluster of its first eliminated variable
+        self.assigned = {v: [] for v in order}
+        for factor in factors:
+            first = min(factor.variables, key=self.position.get)
+            self.assigned[first].append(factor)
+
+        # Link each cluster to the next variable its message mentions,
+        # with `scopes` holding the variables of each upward message
+        self.scopes = dict()
+        self.parent = dict()
+        self.children = {v: [] for v in order}
+        for v in order:
+            scope = set()
+            for factor in self.assigned[v]:
+                scope.update(factor.variables)
+            for child in self.children[v]:
+                scope.update(self.scopes[child])
+            scope.discard(v)
+            self.scopes[v] = scope
+            if scope:
+                self.parent[v] = min(scope, key=self.position.get)
+                self.children[self.parent[v]].append(v)
+
+        # Cached messages sent up from, and down into, each cluster
+        self.upward = dict()
+        self.downward = dict()
+
+    def observe(self, person, trait):
+        """
+        Sets whether `person` has the trait, or retracts what is known
+        about it if `trait` is None.
+        """
+        if self.traits.get(person) == trait:
+            return
+        if trait is None:
+            del self.traits[person]
+        else:
+            self.traits[person] = trait
+
+        # Messages up from the person to the root change, and so does
+        # every message down into a subtree hanging off that path
+        path = [person]
+        while path[-1] in self.parent:
+            path.append(self.parent[path[-1]])
+        on_path = set(path)
+        for v in path:
+            self.upward.pop(v, None)
+            for child in self.children[v]:
+                if child not in on_path:
+                    self.drop_downward(child)
+
+    def query(self, person):
+        """
+        Returns the gene and trait distributions of `person`, in the
+        same form that `main` prints them.
+        """
+        self.send_down(person)
+        factors = self.cluster(person)
+        if person in self.parent:
+            factors.append(self.downward[person])
+        for child in self.children[person]:
+            factors.append(self.send_up(child))
+
+        genes = sum_product(factors, {person}).normalized().table
+        return marginals(
+            {gene: float(genes[gene]) for gene in GENES},
+            self.traits.get(person), self.probs
+        )
+
+    def probabilities(self):
+        """Returns the distributions of everyone, as `query` does."""
+        return {
+            person: self.query(person)
+            for person in sorted(self.position, key=self.position.get,
+                                 reverse=True)
+        }
+
+    def cluster(self, v):
+        """Returns the factors assigned to the cluster of `v`."""
+        factors = list(self.assigned[v])
+        if v in self.traits:
+            factors.append(
+                Factor((v,), self.tables["trait"][self.traits[v]])
+            )
+        return factors
+
+    def send_up(self, v):
+        """Returns the message from the cluster of `v` to its parent."""
+        if v in self.upward:
+            return self.upward[v]
+
+        # Find every message below v that is missing, then compute them
+        # in elimination order so that children come before parents
+        missing = []
+        stack = [v]
+        while stack:
+            u = stack.pop()
+            if u not in self.upward:
+                missing.append(u)
+                stack.extend(self.children[u])
+        for u in sorted(missing, key=self.position.get):
+            factors = self.cluster(u) + [
+                self.upward[child] for child in self.children[u]
+            ]
+            self.upward[u] = sum_product(factors, self.scopes[u]).normalized()
+        return self.upward[v]
+
+    def send_down(self, v):
+        """Computes the message into the cluster of `v` from its parent."""
+        path = []
+        while v in self.parent and v not in self.downward:
+            path.append(v)
+            v = self.parent[v]
+
+        for v in reversed(path):
+            parent = self.parent[v]
+            factors = self.cluster(parent) + [
+                self.send_up(child) for child in self.children[parent]
+                if child != v
+            ]
+            if parent in self.parent:
+                factors.append(self.downward[parent])
+            self.downward[v] = sum_product(
+                factors, self.scopes[v]
+            ).normalized()
+
+    def drop_downward(self, v):
+        """Discards the messages down into `v` and everything below it."""
+        stack = [v]
+        while stack:
+            u = stack.pop()
+            if self.downward.pop(u, None) is not None:
+                stack.extend(self.children[u])
+
+
+def eliminate(people, probs, tables=None):
+    """
+    Computes the gene and trait marginals of every person in `people` by
+    variable elimination over their gene counts, as a `Family` queried
+    once for everyone.
+
+    Returns probabilities in the same form that `main` prints them.
+    """
+    return Family(people, probs, tables).probabilities()
+
+
+def sum_product(factors, keep):
+    """
+    Returns the product of `factors` summed over all variables not in
+    `keep`, or a unit factor if there are no factors.
+    """
+    if not factors:
+        return Factor((), np.ones(()))
+
+    # Label each variable with an einsum subscript
+    labels = dict()
+    operands = []
+    for factor in factors:
+        operands.append(factor.table)
+        operands.append([
+            labels.setdefault(v, len(labels)) for v in factor.variables
+        ])
+    variables = [v for v in labels if v in keep]
+    return Factor(variables, np.einsum(
+        *operands, [labels[v] for v in variables]
+    ))
+
+
+def marginals(genes, trait, probs):
+    """
+    Returns the gene and trait distributions of a person, given their
+    gene distribution and their trait if it is known.
+    """
+    if trait is not None:
+        traits = {True: float(trait), False: float(not trait)}
+    else:
+        has_trait = sum(
+            genes[gene] * probs["trait"][gene][True] for gene in GENES
+        )
+        traits = {True: has_trait, False: 1 - has_trait}
+    return {"gene": genes, "trait": traits}
@@ -1,7 +1,11 @@
 import csv
-import itertools
+import math
 import sys
 
+from elimination import eliminate, inheritance_table, pedigree_order
+from sampling import sample
+from vectorized import vectorize
+
 PROBS = {
 
     # Unconditional probabilities for having gene
@@ -37,13 +41,51 @@ PROBS = {
 }
 
 
+# Probability of a child's gene count given their parents' gene counts,
+# as INHERITANCE[child][mother][father]
+INHERITANCE = inheritance_table(PROBS["mutation"]).tolist()
+
+# Ways to compute the probabilities, by name
+METHODS = ["eliminate", "enumerate", "vectorize", "sample"]
+
+
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    method = sys.argv[2] if len(sys.argv) == 3 else METHODS[0]
+    if len(sys.argv) not in [2, 3] or method not in METHODS:
+        sys.exit(f"Usage: python heredity.py data.csv [{'|'.join(METHODS)}]")
     people = load_data(sys.argv[1])
 
+    if method == "eliminate":
+        probabilities = eliminate(people, PROBS)
+    elif method == "vectorize":
+        probabilities = vectorize(people, PROBS)
+    elif method == "sample":
+        for probabilities, error, sweeps in sample(people, PROBS):
+            pass
+    else:
+        probabilities = enumerate_probabilities(people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+    if method == "sample":
+        print(f"Estimated from {sweeps} sweeps, "
+              f"to within {error:.4f} with 95% confidence")
+
+
+def enumerate_probabilities(people):
+    """
+    Compute the gene and trait distributions of every person by
+    enumerating every assignment of genes and traits to everyone.
+    """
+
     # Keep track of gene and trait probabilities for each person
     probabilities = {
         person: {
@@ -60,38 +102,20 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Loop over every assignment consistent with known information,
+    # adding probabilities relative to the largest joint probability
+    # seen so far so that the sums cannot underflow
+    scale = -math.inf
+    for one_gene, two_genes, have_trait, log_p in assignments(people):
+        if log_p > scale:
+            rescale(probabilities, math.exp(scale - log_p))
+            scale = log_p
+        p = math.exp(log_p - scale)
+        update(probabilities, one_gene, two_genes, have_trait, p)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
-
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    return probabilities
 
 
 def load_data(filename):
@@ -116,16 +140,79 @@ def load_data(filename):
     return data
 
 
-def powerset(s):
+def log_probability(p):
     """
-    Return a list of all possible subsets of set s.
+    Return the natural log of probability `p`, or -inf if `p` is 0.
     """
-    s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    return math.log(p) if p > 0 else -math.inf
+
+
+def gene_count(person, one_gene, two_genes):
+    """Return how many copies of the gene `person` has."""
+    if person in one_gene:
+        return 1
+    elif person in two_genes:
+        return 2
+    return 0
+
+
+def assignments(people):
+    """
+    Lazily generate every assignment of genes and traits to `people`
+    that agrees with the known traits and has nonzero probability.
+
+    People are assigned in pedigree order, so the probability of each
+    partial assignment is known as it is built and a branch is dropped
+    as soon as it reaches zero. Only the current assignment is held in
+    memory, rather than every subset of people.
+
+    Yields tuples (one_gene, two_genes, have_trait, log_p), where `log_p`
+    is the log of the joint probability of the assignment, so that it
+    cannot underflow however many people there are. The sets are reused
+    between assignments, so they must not be kept.
+    """
+    order = pedigree_order(people)
+    genes = dict()
+    one_gene = set()
+    two_genes = set()
+    have_trait = set()
+
+    def assign(k, log_p):
+        if k == len(order):
+            yield one_gene, two_genes, have_trait, log_p
+            return
+
+        person = order[k]
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        trait = people[person]["trait"]
+        for gene in (0, 1, 2):
+            if mother is None and father is None:
+                inherited = PROBS["gene"][gene]
+            else:
+                inherited = INHERITANCE[gene][genes[mother]][genes[father]]
+
+            for has_trait in ((True, False) if trait is None else (trait,)):
+                log_q = (log_p + log_probability(inherited)
+                         + log_probability(PROBS["trait"][gene][has_trait]))
+                if log_q == -math.inf:
+                    continue
+
+                genes[person] = gene
+                if gene == 1:
+                    one_gene.add(person)
+                elif gene == 2:
+                    two_genes.add(person)
+                if has_trait:
+                    have_trait.add(person)
+
+                yield from assign(k + 1, log_q)
+
+                one_gene.discard(person)
+                two_genes.discard(person)
+                have_trait.discard(person)
+
+    return assign(0, 0)
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -139,64 +226,38 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
     """
-    # initial probability
-    prob = 1
-
-    for p in people:
-        # set variables for gene and trait from PROBS
-        if p in one_gene:
-            gene = PROBS['gene'][1]
-            gene_num = 1
-        elif p in two_genes:
-            gene = PROBS['gene'][2]
-            gene_num = 2
-        else:
-            gene = PROBS['gene'][0]
-            gene_num = 0
-        
-        if p in have_trait:
-            trait = PROBS['trait'][gene_num][True]
-        else:
-            trait = PROBS['trait'][gene_num][False]
-        
-        # we can assume either no parental information, or both entries are filled, use as first case
-        if people[p]['mother'] is None and people[p]['father'] is None:
-            prob *= gene * trait
-        else:
-            # Parents are listed, we check each one to see if they have 0, 1 or 2 genes and apply
-            mother = people[p]['mother']
-            father = people[p]['father']
-
-            if mother in one_gene:
-                mother_prob = 0.5
-            elif mother in two_genes:
-                mother_prob = 1 - PROBS['mutation']
-            else:
-                mother_prob = PROBS['mutation']
+    return math.exp(
+        log_joint_probability(people, one_gene, two_genes, have_trait)
+    )
 
-            if father in one_gene:
-                father_prob = 0.5
-            elif father in two_genes:
-                father_prob = 1 - PROBS['mutation']
-            else:
-                father_prob = PROBS['mutation']
-            
-            # check what gene the person has
-            if p in one_gene:
-                # one parent gave the gene
-                mother_gave = mother_prob * (1 - father_prob)
-                father_gave = father_prob * (1 - mother_prob)
-                prob *= mother_gave + father_gave
-            elif p in two_genes:
-                # both parents gave the gene
-                prob *= mother_prob * father_prob
-            else:
-                # no parents gave gene
-                prob *= (1 - father_prob) * (1 - mother_prob)
-            
-            # check if person has trait
-            prob *= trait
-    return prob
+
+def log_joint_probability(people, one_gene, two_genes, have_trait):
+    """
+    Compute and return the log of the joint probability computed by
+    `joint_probability`, summing the logs of its factors so that large
+    families do not underflow to 0.
+    """
+    log_prob = 0
+    for person in people:
+        gene = gene_count(person, one_gene, two_genes)
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+
+        # Without parents the gene count follows the prior, otherwise it
+        # depends on how many copies each parent has to pass on
+        if mother is None and father is None:
+            log_prob += log_probability(PROBS["gene"][gene])
+        else:
+            log_prob += log_probability(INHERITANCE[gene][
+                gene_count(mother, one_gene, two_genes)
+            ][
+                gene_count(father, one_gene, two_genes)
+            ])
+
+        log_prob += log_probability(
+            PROBS["trait"][gene][person in have_trait]
+        )
+    return log_prob
 
 
 def update(probabilities, one_gene, two_genes, have_trait, p):
@@ -220,20 +281,31 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
             probabilities[person]['trait'][False] += p
 
 
+def rescale(probabilities, factor):
+    """
+    Multiply every probability in `probabilities` by `factor`.
+    """
+    for person in probabilities:
+        for distribution in probabilities[person].values():
+            for key in distribution:
+                distribution[key] *= factor
+
+
 def normalize(probabilities):
     """
     Update `probabilities` such that each probability distribution
     is normalized (i.e., sums to 1, with relative proportions the same).
     """
     for person in probabilities:
+        # A distribution with no probability at all is left as it is
         total = sum(probabilities[person]['gene'].values())
-        for key in probabilities[person]['gene']:
+        for key in probabilities[person]['gene'] if total else []:
             prob = probabilities[person]['gene'][key]
             normalized = prob / total
             probabilities[person]['gene'][key] = normalized
         
         total = sum(probabilities[person]['trait'].values())
-        for key in probabilities[person]['trait']:
+        for key in probabilities[person]['trait'] if total else []:
             prob = probabilities[person]['trait'][key]
             normalized = prob / total
             probabilities[person]['trait'][key] = normalized
@@ -0,0 +1,249 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from elimination import GENES, inheritance_table, marginals, pedigree_order
+
+# Number of independent chains each worker process runs
+CHAINS = 64
+
+# Sweeps over the pedigree discarded at the start of every chain
+BURN_IN = 50
+
+# Sweeps run by every chain between estimates
+SWEEPS = 50
+
+# Multiple of the standard error covering 95% of estimates
+Z = 1.96
+
+
+class Block():
+    """
+    People whose gene counts are independent given everyone else's, so
+    that a Gibbs sweep can update them all at once.
+    """
+
+    def __init__(self, members, parents, children):
+
+        # Index of each member, and their position in the block
+        self.members = np.array(members, dtype=np.intp)
+        position = {person: k for k, person in enumerate(members)}
+
+        # Positions of founders, and of everyone else with their parents
+        self.founders = [
+            k for k, i in enumerate(members) if parents[i][0] < 0
+        ]
+        self.descendants = [
+            k for k, i in enumerate(members) if parents[i][0] >= 0
+        ]
+        self.mothers = [parents[members[k]][0] for k in self.descendants]
+        self.fathers = [parents[members[k]][1] for k in self.descendants]
+
+        # Every child of a member, as (position, child, other parent)
+        self.as_mother = ranked([
+            (position[i], child, other)
+            for i in members for child, other, is_mother in children[i]
+            if is_mother
+        ])
+        self.as_father = ranked([
+            (position[i], child, other)
+            for i in members for child, other, is_mother in children[i]
+            if not is_mother
+        ])
+
+
+def ranked(rows):
+    """
+    Splits (position, child, other parent) rows into groups in which no
+    position repeats, the first child of every member, then the second,
+    and so on. Returns every group as a triple of index arrays.
+    """
+    groups = []
+    seen = dict()
+    for row in rows:
+        rank = seen.get(row[0], 0)
+        seen[row[0]] = rank + 1
+        if rank == len(groups):
+            groups.append([])
+        groups[rank].append(row)
+    return [
+        tuple(np.array(column, dtype=np.intp) for column in zip(*group))
+        for group in groups
+    ]
+
+
+def network(people, probs):
+    """
+    Returns the pedigree as arrays for sampling: the names in pedigree
+    order, the index of each person's parents (-1 for founders), the
+    blocks of people updated together, and the logs of the gene prior,
+    of the inheritance table, and of the probability of each person's
+    known trait given their gene count.
+    """
+    names = pedigree_order(people)
+    index = {name: i for i, name in enumerate(names)}
+
+    parents = np.full((len(names), 2), -1)
+    children = [[] for _ in names]
+    evidence = np.ones((len(names), 3))
+    for i, name in enumerate(names):
+        if people[name]["mother"] is not None:
+            mother = index[people[name]["mother"]]
+            father = index[people[name]["father"]]
+            parents[i] = mother, father
+            children[mother].append((i, father, True))
+            children[father].append((i, mother, False))
+        trait = people[name]["trait"]
+        if trait is not None:
+            evidence[i] = [probs["trait"][gene][trait] for gene in range(3)]
+
+    # Color people so no one shares a block with their parents, children
+    # or the other parents of their children
+    colors = []
+    for i in range(len(names)):
+        blanket = {child for child, _, _ in children[i]}
+        blanket.update(other for _, other, _ in children[i])
+        if parents[i][0] >= 0:
+            blanket.update(parents[i])
+        used = {colors[j] for j in blanket if j < i}
+        colors.append(min(set(range(len(used) + 1)) - used))
+    blocks = [
+        Block([i for i in range(len(names)) if colors[i] == color],
+              parents, children)
+        for color in range(max(colors, default=-1) + 1)
+    ]
+
+    prior = [probs["gene"][gene] for gene in range(3)]
+    with np.errstate(divide="ignore"):
+        tables = (
+            np.log(prior),
+            np.log(inheritance_table(probs["mutation"])),
+            np.log(evidence)
+        )
+    return names, parents, blocks, *tables
+
+
+def draw(p, rng):
+    """
+    Returns a gene count for every entry of `p`, where p[0], p[1] and
+    p[2] hold the unnormalized weights of 0, 1 and 2 copies of the gene.
+    """
+    below_one = p[0]
+    below_two = p[0] + p[1]
+    u = rng.random(below_one.shape) * (below_two + p[2])
+    return (u > below_one).astype(np.intp) + (u > below_two)
+
+
+def run_chains(task):
+    """
+    Advances a block of independent chains by Gibbs sampling, updating
+    each person's gene count from its distribution given every other
+    gene count and the known traits. Chains without a state yet start
+    from gene counts sampled forward from the prior.
+
+    Returns a tuple (genes, totals) of the chains' final gene counts and,
+    per chain, person and gene count, the sum over the kept sweeps of the
+    probability of that gene count at its update. Summing probabilities
+    rather than sampled counts gives estimates with lower variance.
+    """
+    network, seed, genes, chains, sweeps, burn_in = task
+    parents, blocks, log_prior, log_inherit, log_evidence = network
+    rng = np.random.default_rng(seed)
+
+    if genes is None:
+        genes = np.zeros((chains, len(parents)), dtype=np.intp)
+        for i, (mother, father) in enumerate(parents):
+            if mother < 0:
+                log_p = np.broadcast_to(log_prior[:, None], (3, chains))
+            else:
+                log_p = log_inherit[:, genes[:, mother], genes[:, father]]
+            genes[:, i] = draw(np.exp(log_p), rng)
+
+    # Arrays are indexed by gene count first, so that reductions over
+    # gene counts are elementwise operations
+    by_mother = log_inherit.transpose(1, 0, 2)
+    by_father = log_inherit.transpose(2, 0, 1)
+    log_evidence = log_evidence.T[:, None, :]
+
+    totals = np.zeros((3, chains, len(parents)))
+    for sweep in range(burn_in + sweeps):
+        for block in blocks:
+            log_p = np.empty((3, chains, len(block.members)))
+            log_p[:, :, block.founders] = log_prior[:, None, None]
+            log_p[:, :, block.descendants] = log_inherit[
+                :, genes[:, block.mothers], genes[:, block.fathers]
+            ]
+            log_p += log_evidence[:, :, block.members]
+
+            # Each child's gene count given every gene count of the parent
+            for positions, kids, others in block.as_mother:
+                log_p[:, :, positions] += by_mother[
+                    :, genes[:, kids], genes[:, others]
+                ]
+            for positions, kids, others in block.as_father:
+                log_p[:, :, positions] += by_father[
+                    :, genes[:, kids], genes[:, others]
+                ]
+
+            p = np.exp(log_p - np.maximum(np.maximum(log_p[0], log_p[1]),
+                                          log_p[2]))
+            genes[:, block.members] = draw(p, rng)
+            if sweep >= burn_in:
+                totals[:, :, block.members] += p / (p[0] + p[1] + p[2])
+    return genes, np.moveaxis(totals, 0, -1)
+
+
+def sample(people, probs, precision=0.005, time_budget=10, seed=None,
+           processes=None, chains=CHAINS):
+    """
+    Estimates the gene and trait marginals of every person in `people`
+    by Gibbs sampling, running blocks of independent chains in parallel
+    processes.
+
+    Yields a tuple (probabilities, error, sweeps) after every round of
+    sweeps, where `probabilities` are the running estimates in the same
+    form that `main` prints them, `error` is the largest half-width of
+    the 95% confidence intervals of the gene marginals, taken from the
+    spread between chains, and `sweeps` counts the sweeps kept so far
+    over all chains. Stops once `error` is within `precision` or
+    `time_budget` seconds have passed.
+    """
+    names, *arrays = network(people, probs)
+    processes = processes or os.cpu_count()
+    seeds = np.random.SeedSequence(seed)
+    deadline = time.perf_counter() + time_budget
+
+    states = [None] * processes
+    totals = np.zeros((processes * chains, len(names), 3))
+    kept = 0
+    with multiprocessing.Pool(processes) as pool:
+        while True:
+            tasks = [
+                (arrays, child, state, chains, SWEEPS,
+                 BURN_IN if state is None else 0)
+                for child, state in zip(seeds.spawn(processes), states)
+            ]
+            results = pool.map(run_chains, tasks)
+            states = [state for state, _ in results]
+            totals += np.concatenate([block for _, block in results])
+            kept += SWEEPS
+
+            # Chains are independent, so their means spread around the truth
+            means = totals / kept
+            estimates = means.mean(axis=0)
+            spread = means.std(axis=0, ddof=1).max()
+            error = Z * spread / np.sqrt(len(means))
+
+            probabilities = {
+                name: marginals(
+                    {gene: float(estimates[i, gene]) for gene in GENES},
+                    people[name]["trait"], probs
+                )
+                for i, name in enumerate(names)
+            }
+            yield probabilities, float(error), kept * len(means)
+
+            if error <= precision or time.perf_counter() >= deadline:
+                return
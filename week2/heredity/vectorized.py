@@ -0,0 +1,86 @@
+import numpy as np
+
+from elimination import GENES, inheritance_table, marginals
+
+# Number of gene assignments evaluated together
+BLOCK_SIZE = 2 ** 16
+
+
+def vectorize(people, probs, block_size=BLOCK_SIZE):
+    """
+    Computes the gene and trait marginals of every person in `people` by
+    exact enumeration, evaluating the joint probability of a whole block
+    of gene assignments at a time.
+
+    Assignment k gives person i the i-th base-3 digit of k copies of the
+    gene. Known traits enter as a likelihood of each gene count, and
+    unknown traits are summed out, so only the 3^n gene assignments need
+    to be enumerated rather than every combination of genes and traits.
+    Joint probabilities are summed as logs, and the marginal sums are
+    kept relative to the largest joint probability seen so far, so that
+    neither underflows.
+
+    Returns probabilities in the same form that `main` prints them.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    n = len(names)
+
+    prior = [probs["gene"][gene] for gene in range(3)]
+    inherit = inheritance_table(probs["mutation"])
+
+    # Probability of each person's known trait given their gene count
+    evidence = np.ones((n, 3))
+    for i, name in enumerate(names):
+        trait = people[name]["trait"]
+        if trait is not None:
+            evidence[i] = [probs["trait"][gene][trait] for gene in range(3)]
+
+    parents = [
+        (index[people[name]["mother"]], index[people[name]["father"]])
+        if people[name]["mother"] is not None else None
+        for name in names
+    ]
+    powers = 3 ** np.arange(n, dtype=np.int64)
+    with np.errstate(divide="ignore"):
+        log_prior = np.log(prior)
+        log_inherit = np.log(inherit)
+        log_evidence = np.log(evidence)
+
+    totals = np.zeros((n, 3))
+    scale = -np.inf
+    for start in range(0, 3 ** n, block_size):
+        assignments = np.arange(start, min(start + block_size, 3 ** n))
+        genes = (assignments[:, None] // powers) % 3
+
+        log_p = np.zeros(len(assignments))
+        for i in range(n):
+            if parents[i] is None:
+                log_p += log_prior[genes[:, i]]
+            else:
+                mother, father = parents[i]
+                log_p += log_inherit[
+                    genes[:, i], genes[:, mother], genes[:, father]
+                ]
+            log_p += log_evidence[i][genes[:, i]]
+
+        # Rescale the sums if this block holds a larger joint probability
+        largest = log_p.max()
+        if largest == -np.inf:
+            continue
+        if largest > scale:
+            totals *= np.exp(scale - largest)
+            scale = largest
+        p = np.exp(log_p - scale)
+
+        for i in range(n):
+            totals[i] += np.bincount(genes[:, i], weights=p, minlength=3)
+
+    totals /= totals.sum(axis=1, keepdims=True)
+    return {
+        name: marginals(
+            {gene: float(totals[i, gene]) for gene in GENES},
+            people[name]["trait"], probs
+        )
+        for i, name in enumerate(names)
+    }
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+# Links in a page, as matched by `pagerank.crawl`
+LINK = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# The start of a link cut off by the end of a chunk
+PARTIAL_LINK = re.compile(rb"<(?:a(?:\s+[^>]*(?:href=\"[^\"]*)?)?)?\Z")
+
+# Bytes read from a file at a time
+CHUNK_SIZE = 1 << 16
+
+# Pages parsed by a worker process at a time
+BATCH_SIZE = 256
+
+# Page IDs by name, shared with worker processes
+INDEX = None
+
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python crawler.py corpus output [processes]")
+    processes = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    start = time.perf_counter()
+    pages, edges = crawl_edges(sys.argv[1], sys.argv[2], processes)
+    elapsed = time.perf_counter() - start
+    print(f"Crawled {pages} pages and {edges} links in {elapsed:.2f} s")
+    print(f"Wrote {sys.argv[2]}.pages and {sys.argv[2]}.edges")
+
+
+def crawl_edges(directory, output, processes=None):
+    """
+    Crawl a directory of HTML pages like `pagerank.crawl`, parsing the
+    pages in a pool of worker processes, and write the links as a
+    compact edge list.
+
+    Pages are numbered in sorted order. `output`.pages lists one page
+    name per line, so that line i names page i, and `output`.edges
+    holds a pair of 32-bit page numbers (page, linked page) per link.
+
+    Return a tuple (pages, edges) of the number of pages and links.
+    """
+    names = sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.name.endswith(".html")
+    )
+    with open(f"{output}.pages", "w") as f:
+        for name in names:
+            f.write(name + "\n")
+
+    index = {name.encode(): i for i, name in enumerate(names)}
+    batches = [
+        (start, [os.path.join(directory, name)
+                 for name in names[start:start + BATCH_SIZE]])
+        for start in range(0, len(names), BATCH_SIZE)
+    ]
+    edges = 0
+    with multiprocessing.Pool(processes, initializer=share_index,
+                              initargs=(index,)) as pool, \
+            open(f"{output}.edges", "wb") as f:
+        for pairs in pool.imap(batch_edges, batches):
+            pairs.tofile(f)
+            edges += len(pairs)
+    return len(names), edges
+
+
+def share_index(index):
+    """Store the page IDs for `page_links` in a worker process."""
+    global INDEX
+    INDEX = index
+
+
+def batch_edges(batch):
+    """
+    Return the (page, linked page) ID pairs of a batch of pages, given as
+    a tuple of the first page's ID and the paths of the pages in order.
+    """
+    start, paths = batch
+    sources = []
+    targets = []
+    for page, path in enumerate(paths, start):
+        links = page_links(path)
+        sources.extend([page] * len(links))
+        targets.extend(links)
+    return np.array([sources, targets], dtype=np.int32).T
+
+
+def page_links(path):
+    """
+    Return the sorted IDs of the other pages in the corpus that the page
+    at `path` links to.
+
+    The file is read in chunks. Whatever might be the start of a link
+    at the end of a chunk is carried over to the front of the next one.
+    """
+    name = os.path.basename(path).encode()
+    links = set()
+    carry = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            text = carry + chunk
+            end = 0
+            for match in LINK.finditer(text):
+                links.add(match.group(1))
+                end = match.end()
+            if not chunk:
+                break
+            partial = PARTIAL_LINK.search(text, end)
+            carry = text[partial.start():] if partial else b""
+
+    links.discard(name)
+    return sorted(INDEX[link] for link in links if link in INDEX)
+
+
+def load_edges(output):
+    """
+    Load an edge list written by `crawl_edges`.
+
+    Return a tuple (pages, edges) where `pages` lists the page names in
+    ID order and `edges` is an array of (page, linked page) ID pairs.
+    """
+    with open(f"{output}.pages") as f:
+        pages = f.read().splitlines()
+    edges = np.fromfile(f"{output}.edges", dtype=np.int32).reshape(-1, 2)
+    return pages, edges
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,75 @@
+import itertools
+import logging
+import multiprocessing
 import os
 import random
 import re
 import sys
 from collections import defaultdict
 
+import numpy as np
+
+from crawler import load_edges
+
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Total change in PageRank values at which iteration stops
+TOLERANCE = 1e-6
+
+# Most sweeps iteration makes before giving up
+MAX_ITERATIONS = 1000
+
+# Ways of iterating PageRank values, see `iterate_pagerank`
+METHODS = ["gauss-seidel", "jacobi", "aitken", "quadratic"]
+
+# Blocks of pages a Gauss-Seidel sweep updates one after another
+SWEEP_BLOCKS = 64
+
+# Sweeps between extrapolations
+EXTRAPOLATE_EVERY = 10
+
+# Largest change between a page's last two step ratios for Aitken's
+# process to treat its rank as converging geometrically
+SETTLED = 0.01
+
+# Independent random surfers, and the groups they are split into so
+# that the spread between groups estimates the error
+WALKERS = 16384
+GROUPS = 16
+
+# Fewest steps each surfer takes, which caps the surfers for small `n`
+MIN_STEPS = 16
+
+# Steps the surfers take between counting their visits
+CHUNK = 256
+
+# Links of the corpus, shared with worker processes
+LINKS = None
+
+logger = logging.getLogger(__name__)
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
+    method = sys.argv[2] if len(sys.argv) == 3 else METHODS[0]
+    if len(sys.argv) not in [2, 3] or method not in METHODS:
+        sys.exit(f"Usage: python pagerank.py corpus [{'|'.join(METHODS)}]")
+
+    # A corpus is a directory of pages, or an edge list from crawler.py
+    if os.path.isdir(sys.argv[1]):
+        corpus = crawl(sys.argv[1])
+    else:
+        corpus = load_edges(sys.argv[1])
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    ranks, errors = parallel_sample_pagerank(corpus, DAMPING, SAMPLES)
+    print(f"PageRank Results from Parallel Sampling (n = {SAMPLES})")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f} ± {errors[page]:.4f}")
+    ranks = iterate_pagerank(corpus, DAMPING, method)
+    print(f"PageRank Results from Iteration ({method})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
@@ -91,64 +143,360 @@ def sample_pagerank(corpus, damping_factor, n):
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    samples = defaultdict(int)
+    pages, offsets, targets = outgoing_links(corpus)
+    offsets = offsets.tolist()
+    targets = targets.tolist()
+    visits = [0] * len(pages)
 
     # To start, choose a random page from the corpus
-    page = random.choice(list(corpus.keys()))
+    page = random.randrange(len(pages))
 
     for _ in range(n):
-        # run the transition model on our chosen page
-        new_page = transition_model(corpus, page, damping_factor)
+        # Follow one of the page's links with probability damping_factor,
+        # otherwise (or if there are none) go to any page in the corpus
+        start = offsets[page]
+        links = offsets[page + 1] - start
+        if links and random.random() < damping_factor:
+            page = targets[start + int(random.random() * links)]
+        else:
+            page = int(random.random() * len(pages))
+        visits[page] += 1
 
-        # choose the next page based on the previous transition model
-        page = random.choices(list(new_page.keys()), list(new_page.values()), k=1)[0]
+    return {page: visits[i] / n for i, page in enumerate(pages)}
 
-        # Now we increment the probability that it was chosen by 1/n (chosen out of n options in the sample)
-        samples[page] += 1/n
-    
-    return samples
 
+def parallel_sample_pagerank(corpus, damping_factor, n, walkers=WALKERS,
+                             processes=None, seed=None):
+    """
+    Return PageRank values for each page by sampling about `n` pages
+    with many independent random surfers, split into groups that walk
+    in a pool of worker processes.
 
-def iterate_pagerank(corpus, damping_factor):
+    Return a tuple (ranks, errors) of dictionaries where keys are page
+    names, `ranks` are their estimated PageRank values and `errors` are
+    the standard errors of those estimates, from the spread between
+    the groups.
+    """
+    pages, offsets, targets = outgoing_links(corpus)
+    groups = max(2, min(GROUPS, walkers))
+    walkers = max(1, min(walkers, n // MIN_STEPS) // groups)
+    steps = max(1, n // (groups * walkers))
+    tasks = [
+        (damping_factor, walkers, steps, seed)
+        for seed in np.random.SeedSequence(seed).spawn(groups)
+    ]
+
+    with multiprocessing.Pool(processes, initializer=share_links,
+                              initargs=(offsets, targets)) as pool:
+        counts = pool.map(walk, tasks)
+
+    # Pool every visit for the ranks, and compare groups for the error
+    counts = np.array(counts, dtype=float)
+    ranks = counts.sum(axis=0) / counts.sum()
+    estimates = counts / counts.sum(axis=1, keepdims=True)
+    errors = estimates.std(axis=0, ddof=1) / np.sqrt(groups)
+    return dict(zip(pages, ranks.tolist())), dict(zip(pages, errors.tolist()))
+
+
+def share_links(offsets, targets):
+    """Store the links of the corpus for `walk` in a worker process."""
+    global LINKS
+    LINKS = offsets, targets
+
+
+def walk(task):
+    """
+    Return how many times a group of independent random surfers visits
+    each page, walking all of them at once with NumPy.
+
+    Every surfer starts at a random page, which counts as its first
+    sample, and then takes `steps - 1` steps of the transition model.
+    Each then keeps following links until it next jumps to a random
+    page, so that the counts cover only whole runs that begin at a
+    random page. Cutting runs short would undercount the pages that
+    are reached later in a run.
+    """
+    damping_factor, walkers, steps, seed = task
+    offsets, targets = LINKS
+    n = len(offsets) - 1
+    degree = np.diff(offsets)
+    rng = np.random.default_rng(seed)
+
+    counts = np.zeros(n, dtype=np.int64)
+    history = np.empty((CHUNK, walkers), dtype=np.int64)
+    pages = rng.integers(n, size=walkers)
+    for step in range(steps):
+        if step:
+            # Follow a link with probability damping_factor, otherwise
+            # (or if there are none) go to any page in the corpus
+            links = degree[pages]
+            follow = (links > 0) & (rng.random(walkers) < damping_factor)
+            following = pages[follow]
+            pages = rng.integers(n, size=walkers)
+            pages[follow] = targets[
+                offsets[following] + (
+                    rng.random(len(following)) * degree[following]
+                ).astype(np.int64)
+            ]
+
+        # Count visits in chunks, so counting costs O(n) per chunk
+        history[step % CHUNK] = pages
+        if step % CHUNK == CHUNK - 1 or step == steps - 1:
+            counts += np.bincount(
+                history[:step % CHUNK + 1].ravel(), minlength=n
+            )
+
+    # Finish every surfer's current run of followed links
+    while len(pages):
+        links = degree[pages]
+        pages = pages[(links > 0) & (rng.random(len(pages)) < damping_factor)]
+        pages = targets[
+            offsets[pages] + (
+                rng.random(len(pages)) * degree[pages]
+            ).astype(np.int64)
+        ]
+        np.add.at(counts, pages, 1)
+    return counts
+
+
+def outgoing_links(corpus):
+    """
+    Return the links of `corpus` as arrays of page indices, where
+    `corpus` is either a dictionary as returned by `crawl` or a tuple
+    (pages, edges) as returned by `crawler.load_edges`.
+
+    Return a tuple (pages, offsets, targets) where `pages` lists the
+    pages in index order and the pages linked to by page i are
+    targets[offsets[i]:offsets[i + 1]].
+    """
+    if not isinstance(corpus, dict):
+        pages, edges = corpus
+        return (pages, *edge_links(len(pages), edges))
+
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum(
+        np.fromiter(map(len, corpus.values()), dtype=np.int64,
+                    count=len(pages)),
+        out=offsets[1:]
+    )
+    targets = np.fromiter(
+        map(index.__getitem__, itertools.chain.from_iterable(corpus.values())),
+        dtype=np.int64, count=offsets[-1]
+    )
+    return pages, offsets, targets
+
+
+def edge_links(n, edges):
+    """
+    Return the links between `n` pages, given as an array of (page,
+    linked page) index pairs, as a tuple (offsets, targets) in the form
+    `outgoing_links` returns them.
+    """
+    sources = edges[:, 0].astype(np.int64)
+    targets = edges[np.argsort(sources, kind="stable"), 1].astype(np.int64)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    return offsets, targets
+
+
+def transition_matrix(corpus):
+    """
+    Return the links of `corpus`, in either form `outgoing_links` takes,
+    as a sparse matrix in CSR form, with one row for each page listing
+    the pages that link to it.
+
+    Return a tuple (pages, indptr, indices, out_degree) where `pages`
+    lists the pages in index order, the pages linking to page i are
+    indices[indptr[i]:indptr[i + 1]], and out_degree[j] is the number
+    of links on page j.
+    """
+    pages, offsets, targets = outgoing_links(corpus)
+    out_degree = np.diff(offsets)
+    sources = np.repeat(np.arange(len(pages)), out_degree)
+
+    # Group links by the page they point to
+    indices = sources[np.argsort(targets, kind="stable")]
+    indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=len(pages)), out=indptr[1:])
+    return pages, indptr, indices, out_degree
+
+
+def iterate_pagerank(corpus, damping_factor, method=METHODS[0],
+                     tolerance=TOLERANCE, max_iter=MAX_ITERATIONS):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
 
+    `method` is one of METHODS. "jacobi" computes every page's new rank
+    from the previous ranks, while "gauss-seidel" updates the pages a
+    block at a time, each block from the latest ranks of the others.
+    "aitken" and "quadratic" make Jacobi sweeps, but every
+    EXTRAPOLATE_EVERY sweeps jump to the limit that the last four ranks
+    are heading towards. A jump is undone if the sweep after it changes
+    the ranks more than the sweep before it did, and the sweeps until
+    the next jump then double. Iteration stops once the total change in
+    the ranks over a sweep is below `tolerance`, or after `max_iter`
+    sweeps, and the change after every sweep is logged.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    page_rank = defaultdict(lambda: 1/len(corpus))
-    prev = defaultdict(int)
-
-    # populate our first dict
-    for page in corpus:
-        prev[page] = 1/len(corpus)
-
-    while True:
-        for page in corpus:
-            sum = 0
-            for other in corpus:
-                # A page that has no links at all should be interpreted as having one link for every page in the corpus (including itself).
-                if len(corpus[other]) == 0:
-                    sum += page_rank[other] / len(corpus)
-                
-                # check to see if page is linked, if it is, update our sum value accordingly
-                if other != page and page in corpus[other]:
-                    sum += page_rank[other] / len(corpus[other])
-
-            # Calculate the iterative function
-            pr = ((1 - damping_factor) / len(corpus)) + damping_factor * sum
-
-            page_rank[page] = pr
-        
-        if max([abs(page_rank[i] - prev[i]) for i in prev.keys()]) < 0.001:
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method}")
+
+    pages, indptr, indices, out_degree = transition_matrix(corpus)
+    n = len(pages)
+
+    # Share of a page's rank sent along each of its links
+    share = 1 / np.maximum(out_degree, 1)
+    dangling = out_degree == 0
+    blocks = row_blocks(
+        indptr, SWEEP_BLOCKS if method == "gauss-seidel" else 1
+    )
+
+    ranks = np.full(n, 1 / n)
+    history = [ranks]
+    jump = None
+    wait = EXTRAPOLATE_EVERY
+    next_jump = wait
+    change = np.inf
+    for iteration in range(1, max_iter + 1):
+        new_ranks = sweep(ranks, indices, blocks, share, dangling,
+                          damping_factor)
+        change = np.abs(new_ranks - ranks).sum()
+        logger.debug("Iteration %d (%s): change %.3e",
+                     iteration, method, change)
+
+        # Go back to the ranks before a jump that made things worse
+        if jump is not None:
+            before, previous = jump
+            jump = None
+            if change > previous:
+                logger.debug("Iteration %d (%s): extrapolation rejected",
+                             iteration, method)
+                ranks = before
+                history = [ranks]
+                wait *= 2
+                next_jump = iteration + wait
+                continue
+
+        ranks = new_ranks
+        if change < tolerance:
             break
 
-        prev = page_rank.copy()
-    
-    return page_rank
-            
+        history = history[-3:] + [ranks]
+        if (method in ["aitken", "quadratic"] and len(history) == 4
+                and iteration >= next_jump):
+            jump = ranks, change
+            next_jump = iteration + wait
+            if method == "aitken":
+                ranks = aitken_extrapolation(*history)
+            else:
+                ranks = quadratic_extrapolation(*history)
+            history = [ranks]
+    else:
+        logger.warning("PageRank did not converge in %d iterations, "
+                       "last change %.3e", max_iter, change)
+
+    return dict(zip(pages, (ranks / ranks.sum()).tolist()))
+
+
+def row_blocks(indptr, count):
+    """
+    Split the rows of a CSR matrix into `count` blocks of about the same
+    number of rows, for `sweep` to update one after another.
+
+    Return a list of tuples (start, end, entries, rows, starts), one for
+    each block of rows start to end, where `entries` is the slice of the
+    block's entries, `rows` are the offsets from `start` of the rows
+    with any entries and `starts` are where those rows begin within the
+    block's entries.
+    """
+    n = len(indptr) - 1
+    bounds = np.linspace(0, n, min(count, n) + 1).astype(np.int64)
+    blocks = []
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        rows = np.flatnonzero(np.diff(indptr[start:end + 1]))
+        blocks.append((
+            start, end, slice(indptr[start], indptr[end]),
+            rows, indptr[start + rows] - indptr[start]
+        ))
+    return blocks
+
+
+def sweep(ranks, indices, blocks, share, dangling, damping_factor):
+    """
+    Return the ranks after one sweep of updates, block by block, where
+    each block's new ranks are computed from the latest ranks of every
+    page. With a single block this is a Jacobi sweep, and with a block
+    per page a Gauss-Seidel sweep.
+    """
+    n = len(ranks)
+    ranks = ranks.copy()
+    flow = ranks * share
+
+    # A page with no links links to every page, which adds the same
+    # amount to every page rather than a dense row to the matrix
+    spread = ranks[dangling].sum()
+
+    for start, end, entries, rows, starts in blocks:
+        # Sum the rank flowing into each page along its incoming links
+        incoming = np.zeros(end - start)
+        if len(rows):
+            incoming[rows] = np.add.reduceat(flow[indices[entries]], starts)
+
+        new_ranks = (1 - damping_factor) / n + damping_factor * (
+            incoming + spread / n
+        )
+        spread += (new_ranks - ranks[start:end])[dangling[start:end]].sum()
+        ranks[start:end] = new_ranks
+        flow[start:end] = new_ranks * share[start:end]
+
+    # Blocks updated from a mix of old and new ranks leave the total off
+    # 1, and that part of the error would otherwise shrink only slowly
+    return ranks / ranks.sum()
+
+
+def aitken_extrapolation(first, second, third, fourth):
+    """
+    Return the limit that four successive ranks are heading towards, by
+    Aitken's delta-squared process on each page's rank. Only pages whose
+    rank changes by a ratio below 1 that has settled, differing by at
+    most SETTLED over the last two steps, are extrapolated, and the rest
+    keep the latest rank.
+    """
+    step = fourth - third
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = step / (third - second)
+        settled = np.abs(ratio - (third - second) / (second - first))
+    usable = (np.abs(ratio) < 1) & (settled <= SETTLED)
+    limit = fourth.copy()
+    limit[usable] += step[usable] * ratio[usable] / (1 - ratio[usable])
+    limit = np.maximum(limit, 0)
+    return limit / limit.sum()
+
+
+def quadratic_extrapolation(first, second, third, fourth):
+    """
+    Return the limit that four successive ranks are heading towards, by
+    quadratic extrapolation: assume the error in the ranks lies mostly
+    along the next two eigenvectors of the transition matrix, and fit
+    the combination of the last three ranks that cancels it.
+    """
+    changes = np.stack([second - first, third - first], axis=1)
+    gamma = np.linalg.lstsq(changes, first - fourth, rcond=None)[0]
+    limit = (
+        (gamma[0] + gamma[1] + 1) * second
+        + (gamma[1] + 1) * third
+        + fourth
+    )
+    limit = np.abs(limit)
+    return limit / limit.sum()
+
 
 if __name__ == "__main__":
     main()